@@ -2,15 +2,16 @@ import argparse
 import sys
 import os
 import dotenv
+import pandas as pd
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from models.llm_judge import LLMJudge
+from models.llm_judge import LLMJudge, JudgeEnsemble
+from models.lexical_judge import calibrate_thresholds, DEFAULT_PASS_THRESHOLD
 
 dotenv.load_dotenv()
 
-def main():
-    DEFAULT_PROMPT = """
+DEFAULT_PROMPT = """
         Given this question and the CORRECT answer, determine whether the response is correct (meaning it factually aligns with the correct answer). 
         In some cases, 0 and "I do not have an answer" are considered to be both correct. 
         If both responses say that there is no answer, this should be judged as true.
@@ -24,7 +25,8 @@ def main():
 
         Instructions: Respond with only "true" if the response factually aligns with the correct answer, or "false" if it does not. Do not provide any explanation - just "true" or "false".
         """
-      
+
+def main():
     parser = argparse.ArgumentParser(description='Evaluate longmemeval results using LLM judge')
     
     parser.add_argument('--prompt', type=str, default=DEFAULT_PROMPT,
@@ -45,23 +47,93 @@ def main():
                        help='Maximum context length in tokens (default: 1_047_576)')
     parser.add_argument('--max-tokens-per-minute', type=int, default=2_000_000,
                        help='Maximum tokens per minute for rate limiting (default: 2_000_000)')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
+    parser.add_argument('--prejudge', action='store_true',
+                       help='Judge clear passes and fails locally by lexical match and send only the uncertain rows to the LLM judge')
+    parser.add_argument('--prejudge-pass-threshold', type=float, default=DEFAULT_PASS_THRESHOLD,
+                       help=f'Lexical score at or above which a row is judged true (default: {DEFAULT_PASS_THRESHOLD})')
+    parser.add_argument('--prejudge-calibration-path', type=str, default=None,
+                       help='Optional already-judged CSV to calibrate the pre-judge thresholds on (overrides --prejudge-pass-threshold; without it no row is judged false locally)')
+    parser.add_argument('--judge-batch-size', type=int, default=1,
+                       help='Number of rows judged per request, answered as a JSON array of verdicts (default: 1, one request per row)')
+    parser.add_argument('--verdict-store-path', type=str, default=None,
+                       help='Optional SQLite file of judge verdicts; rows judged before with the same judge model, prompt and (question, answer, output) are not sent again')
+    parser.add_argument('--constrained', action='store_true',
+                       help='Ask for a schema-constrained true/false verdict and store its logprob confidence in llm_judge_output_confidence where the provider reports logprobs')
+    parser.add_argument('--escalation-model-names', type=str, nargs='+', default=None,
+                       help='Stronger judge models consulted after --model-name, only for low-confidence, audited or contested rows (enables the ensemble)')
+    parser.add_argument('--ensemble-confidence-threshold', type=float, default=0.9,
+                       help='Verdict confidence below which a row is escalated to the next judge (default: 0.9)')
+    parser.add_argument('--ensemble-audit-rate', type=float, default=0.05,
+                       help='Fraction of confident rows escalated anyway to audit the first judge (default: 0.05)')
     
     args = parser.parse_args()
+
+    # The ensemble judges every row itself with schema-constrained verdicts, one row per request
+    if args.escalation_model_names:
+        unsupported = [
+            flag for flag, is_set in [
+                ('--prejudge', args.prejudge),
+                ('--prejudge-calibration-path', args.prejudge_calibration_path is not None),
+                ('--judge-batch-size', args.judge_batch_size != 1),
+                ('--constrained', args.constrained),
+            ] if is_set
+        ]
+        if unsupported:
+            parser.error(f"--escalation-model-names cannot be combined with {', '.join(unsupported)}")
     
     try:
+        prejudge_thresholds = None
+        if args.prejudge:
+            prejudge_thresholds = (args.prejudge_pass_threshold, None)
+            if args.prejudge_calibration_path:
+                prejudge_thresholds = calibrate_thresholds(
+                    pd.read_csv(args.prejudge_calibration_path),
+                    output_column=args.output_column,
+                    answer_column=args.correct_answer_column
+                )
+
+        if args.escalation_model_names:
+            judges = [
+                LLMJudge(
+                    prompt=args.prompt,
+                    model_name=model_name,
+                    output_column=args.output_column,
+                    question_column=args.question_column,
+                    correct_answer_column=args.correct_answer_column,
+                    verdict_store_path=args.verdict_store_path
+                )
+                for model_name in [args.model_name] + args.escalation_model_names
+            ]
+            ensemble = JudgeEnsemble(judges, args.ensemble_confidence_threshold, args.ensemble_audit_rate)
+            ensemble.evaluate(
+                input_path=args.input_path,
+                output_path=args.output_path,
+                max_context_length=args.max_context_length,
+                max_tokens_per_minute=args.max_tokens_per_minute,
+                trace_path=args.trace_path
+            )
+            return
+
         judge = LLMJudge(
             prompt=args.prompt,
             model_name=args.model_name,
             output_column=args.output_column,
             question_column=args.question_column,
-            correct_answer_column=args.correct_answer_column
+            correct_answer_column=args.correct_answer_column,
+            verdict_store_path=args.verdict_store_path
         )
         
         judge.evaluate(
             input_path=args.input_path,
             output_path=args.output_path,
             max_context_length=args.max_context_length,
-            max_tokens_per_minute=args.max_tokens_per_minute
+            max_tokens_per_minute=args.max_tokens_per_minute,
+            trace_path=args.trace_path,
+            prejudge_thresholds=prejudge_thresholds,
+            judge_batch_size=args.judge_batch_size,
+            constrained=args.constrained
         )
         
     except Exception as e:
@@ -1,16 +1,15 @@
 import argparse
 import sys
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-def visualize_longmemeval_results(focused_filepath: str, full_filepath: str, model_name: str, output_path: str):
-    focused_df = pd.read_csv(focused_filepath)
-    full_df = pd.read_csv(full_filepath)
-    
-    focused_mean = focused_df['llm_judge_output'].mean()
-    full_mean = full_df['llm_judge_output'].mean()
-    
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from plotting import render_figures
+
+def plot_longmemeval_results(focused_mean: float, full_mean: float, model_name: str, output_path: str):
     focused_color = "#EB4026"
     full_color = "#3A76E5"
     
@@ -29,28 +28,50 @@ def visualize_longmemeval_results(focused_filepath: str, full_filepath: str, mod
     plt.close()
 
 
+def visualize_longmemeval_results(focused_filepath: str, full_filepath: str, model_name: str, output_path: str):
+    visualize_many_longmemeval_results([dict(focused_filepath=focused_filepath, full_filepath=full_filepath,
+                                             model_name=model_name, output_path=output_path)], workers=1)
+
+
+def visualize_many_longmemeval_results(runs: list[dict], workers: int = None):
+    # Each run holds visualize_longmemeval_results' arguments; the means are computed here and the figures are
+    # rendered in parallel worker processes
+    figures = []
+    for run in runs:
+        focused_mean = pd.read_csv(run['focused_filepath'])['llm_judge_output'].mean()
+        full_mean = pd.read_csv(run['full_filepath'])['llm_judge_output'].mean()
+        figures.append((plot_longmemeval_results, dict(focused_mean=focused_mean, full_mean=full_mean,
+                                                       model_name=run['model_name'], output_path=run['output_path'])))
+    render_figures(figures, workers)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Visualize LongMemEval results')
     
-    parser.add_argument('--focused-path', type=str, required=True,
-                       help='Path to focused results CSV file')
-    parser.add_argument('--full-path', type=str, required=True,
-                       help='Path to full results CSV file')
-    parser.add_argument('--model-name', type=str, required=True,
-                       help='Model name for plot titles')
-    parser.add_argument('--output-path', type=str, required=True,
-                       help='Output path for PNG file')
+    parser.add_argument('--focused-path', type=str, nargs='+', required=True,
+                       help='Path to focused results CSV file (one per model when re-plotting several)')
+    parser.add_argument('--full-path', type=str, nargs='+', required=True,
+                       help='Path to full results CSV file (one per model, in the same order)')
+    parser.add_argument('--model-name', type=str, nargs='+', required=True,
+                       help='Model name for plot titles (one per model, in the same order)')
+    parser.add_argument('--output-path', type=str, nargs='+', required=True,
+                       help='Output path for PNG file (one per model, in the same order)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Processes used to render the figures (default: all CPUs)')
     
     args = parser.parse_args()
     
     try:
-        visualize_longmemeval_results(
-            focused_filepath=args.focused_path,
-            full_filepath=args.full_path,
-            model_name=args.model_name,
-            output_path=args.output_path
-        )
-        print(f"Visualization saved to: {args.output_path}")
+        if not len(args.focused_path) == len(args.full_path) == len(args.model_name) == len(args.output_path):
+            raise ValueError("--focused-path, --full-path, --model-name and --output-path need the same number of values")
+        
+        visualize_many_longmemeval_results([
+            dict(focused_filepath=focused_path, full_filepath=full_path, model_name=model_name, output_path=output_path)
+            for focused_path, full_path, model_name, output_path
+            in zip(args.focused_path, args.full_path, args.model_name, args.output_path)
+        ], workers=args.workers)
+        for output_path in args.output_path:
+            print(f"Visualization saved to: {output_path}")
         
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -0,0 +1,133 @@
+import argparse
+import math
+import re
+import sys
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from sessions import SessionPrompts, check_full_prompts, get_session_prompts, session_text
+
+DEFAULT_TOKEN_BUDGETS = [8_000, 16_000, 32_000, 64_000]
+OUTPUT_COLUMNS = ["question_id", "question_type", "question", "answer", "token_budget", "prompt", "token_count", "sessions", "evidence_recall"]
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+# Okapi BM25 over one question's sessions; small enough to build per question in memory
+class BM25Index:
+    def __init__(self, documents: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(document)) for document in documents]
+        self.lengths = np.array([sum(counts.values()) for counts in self.term_counts], dtype=float)
+        self.average_length = self.lengths.mean() if len(documents) else 0.0
+
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        self.idf = {
+            term: math.log((len(documents) - frequency + 0.5) / (frequency + 0.5) + 1)
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.term_counts))
+        norms = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-9))
+        for term in set(tokenize(query)):
+            if term not in self.idf:
+                continue
+            frequencies = np.array([counts.get(term, 0) for counts in self.term_counts], dtype=float)
+            scores += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + norms)
+        return scores
+
+    def rank(self, query: str) -> list[int]:
+        # Highest score first; equal scores keep the session order
+        return np.argsort(-self.scores(query), kind="stable").tolist()
+
+
+def select_sessions(prompts: SessionPrompts, ranking: list[int], token_budget: int) -> list[int]:
+    # Greedily take the best-ranked sessions that still fit; a session too long for what is left is skipped, not
+    # the end of the search
+    selected = []
+    for session in ranking:
+        if prompts.sum_tokens(selected + [session]) <= token_budget:
+            selected.append(session)
+
+    # Only without clean joins can the exact count exceed the summed one; drop the lowest-ranked sessions until it fits
+    while selected and prompts.token_count(selected) > token_budget:
+        selected.pop()
+    return selected
+
+
+def create_retrieval_prompts(dataset_path: str, output_path: str, token_budgets: list[int], cleaned_full_path: str = None) -> pd.DataFrame:
+    session_prompts = get_session_prompts(dataset_path)
+    if cleaned_full_path:
+        check_full_prompts(session_prompts, cleaned_full_path)
+
+    rows = []
+    for prompts in tqdm(session_prompts, desc="Questions"):
+        entry = prompts.entry
+        index = BM25Index([session_text(session) for session in entry['haystack_sessions']])
+        ranking = index.rank(entry['question'])
+
+        for token_budget in token_budgets:
+            selected = select_sessions(prompts, ranking, token_budget)
+            rows.append({
+                'question_id': entry['question_id'],
+                'question_type': entry['question_type'],
+                'question': entry['question'],
+                'answer': str(entry['answer']),
+                'token_budget': token_budget,
+                'prompt': prompts.prompt(selected),
+                'token_count': prompts.token_count(selected),
+                'sessions': len(selected),
+                'evidence_recall': prompts.evidence_recall(selected),
+            })
+
+    df = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
+    df.to_csv(output_path, index=False)
+
+    print(f"Created {len(df)} retrieval prompts at budgets {token_budgets}")
+    for token_budget in token_budgets:
+        budget_df = df[df['token_budget'] == token_budget]
+        print(f"  {token_budget:,} tokens: {budget_df['sessions'].mean():.1f} sessions, "
+              f"evidence recall {budget_df['evidence_recall'].mean():.3f}")
+    print(f"Results saved to {output_path}")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create LongMemEval prompts from BM25-retrieved sessions at several token budgets')
+
+    parser.add_argument('--dataset-path', type=str, required=True,
+                       help='LongMemEval JSON with haystack sessions (e.g. ../../data/longmemeval_s.json)')
+    parser.add_argument('--output-path', type=str, required=True,
+                       help='Output CSV with one prompt per question and budget (prompt, token_count, token_budget columns)')
+    parser.add_argument('--token-budgets', type=int, nargs='+', default=DEFAULT_TOKEN_BUDGETS,
+                       help=f'Prompt token budgets (default: {" ".join(str(budget) for budget in DEFAULT_TOKEN_BUDGETS)})')
+    parser.add_argument('--cleaned-full-path', type=str, default=None,
+                       help='Cleaned full-context CSV (e.g. ../../data/cleaned_longmemeval_s_full.csv); first check that rendering all sessions reproduces its full_prompt')
+
+    args = parser.parse_args()
+
+    try:
+        if not os.path.exists(args.dataset_path):
+            raise ValueError(f"Dataset does not exist: {args.dataset_path}")
+
+        create_retrieval_prompts(
+            dataset_path=args.dataset_path,
+            output_path=args.output_path,
+            token_budgets=sorted(args.token_budgets),
+            cleaned_full_path=args.cleaned_full_path
+        )
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
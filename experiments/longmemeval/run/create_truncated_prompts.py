@@ -0,0 +1,114 @@
+import argparse
+import hashlib
+import sys
+import os
+import pandas as pd
+from tqdm import tqdm
+
+from sessions import SessionPrompts, check_full_prompts, get_session_prompts
+
+DEFAULT_TOKEN_BUDGETS = [8_000, 16_000, 32_000, 64_000, 96_000]
+OUTPUT_COLUMNS = ["question_id", "question_type", "question", "answer", "token_budget", "prompt", "token_count", "sessions", "total_sessions"]
+
+
+def keep_priority(prompts: SessionPrompts, seed: int = 0) -> list[int]:
+    # Irrelevant sessions in the order they are kept: a hash of (seed, question, session) gives the same order on every
+    # run and machine, and a budget's kept sessions are mostly a subset of the next larger budget's
+    entry = prompts.entry
+    evidence = set(prompts.evidence)
+    others = [i for i in range(len(prompts.blocks)) if i not in evidence]
+    return sorted(others, key=lambda i: hashlib.sha256(f"{seed}\0{entry['question_id']}\0{entry['haystack_session_ids'][i]}".encode("utf-8")).hexdigest())
+
+
+def truncate_sessions(prompts: SessionPrompts, priority: list[int], token_budget: int) -> list[int] | None:
+    # Evidence sessions are always kept; None if they alone do not fit the budget
+    kept = list(prompts.evidence)
+    if prompts.sum_tokens(kept) > token_budget:
+        return None
+
+    for session in priority:
+        if prompts.sum_tokens(kept + [session]) <= token_budget:
+            kept.append(session)
+
+    # Only without clean joins can the exact count exceed the summed one; drop the last kept sessions until it fits
+    while len(kept) > len(prompts.evidence) and prompts.token_count(kept) > token_budget:
+        kept.pop()
+    return kept if prompts.token_count(kept) <= token_budget else None
+
+
+def create_truncated_prompts(dataset_path: str, output_path: str, token_budgets: list[int], seed: int = 0, cleaned_full_path: str = None) -> pd.DataFrame:
+    session_prompts = get_session_prompts(dataset_path)
+    if cleaned_full_path:
+        check_full_prompts(session_prompts, cleaned_full_path)
+
+    rows = []
+    skipped = {token_budget: 0 for token_budget in token_budgets}
+    for prompts in tqdm(session_prompts, desc="Questions"):
+        entry = prompts.entry
+        priority = keep_priority(prompts, seed)
+
+        for token_budget in token_budgets:
+            kept = truncate_sessions(prompts, priority, token_budget)
+            if kept is None:
+                skipped[token_budget] += 1
+                continue
+
+            rows.append({
+                'question_id': entry['question_id'],
+                'question_type': entry['question_type'],
+                'question': entry['question'],
+                'answer': str(entry['answer']),
+                'token_budget': token_budget,
+                'prompt': prompts.prompt(kept),
+                'token_count': prompts.token_count(kept),
+                'sessions': len(kept),
+                'total_sessions': len(prompts.blocks),
+            })
+
+    df = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
+    df.to_csv(output_path, index=False)
+
+    print(f"Created {len(df)} prompts at budgets {token_budgets}")
+    for token_budget in token_budgets:
+        budget_df = df[df['token_budget'] == token_budget]
+        print(f"  {token_budget:,} tokens: {len(budget_df)} questions, {budget_df['sessions'].mean():.1f} sessions kept, "
+              f"{skipped[token_budget]} skipped (evidence alone exceeds the budget)")
+    print(f"Results saved to {output_path}")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create LongMemEval full-context prompts truncated to several token budgets, keeping the evidence sessions')
+
+    parser.add_argument('--dataset-path', type=str, required=True,
+                       help='LongMemEval JSON with haystack sessions (e.g. ../../data/longmemeval_s.json)')
+    parser.add_argument('--output-path', type=str, required=True,
+                       help='Output CSV with one prompt per question and budget (prompt, token_count, token_budget columns)')
+    parser.add_argument('--token-budgets', type=int, nargs='+', default=DEFAULT_TOKEN_BUDGETS,
+                       help=f'Prompt token budgets (default: {" ".join(str(budget) for budget in DEFAULT_TOKEN_BUDGETS)})')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Seed of the order in which irrelevant sessions are kept (default: 0)')
+    parser.add_argument('--cleaned-full-path', type=str, default=None,
+                       help='Cleaned full-context CSV (e.g. ../../data/cleaned_longmemeval_s_full.csv); first check that rendering all sessions reproduces its full_prompt')
+
+    args = parser.parse_args()
+
+    try:
+        if not os.path.exists(args.dataset_path):
+            raise ValueError(f"Dataset does not exist: {args.dataset_path}")
+
+        create_truncated_prompts(
+            dataset_path=args.dataset_path,
+            output_path=args.output_path,
+            token_budgets=sorted(args.token_budgets),
+            seed=args.seed,
+            cleaned_full_path=args.cleaned_full_path
+        )
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
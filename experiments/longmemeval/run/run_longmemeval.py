@@ -28,25 +28,63 @@ def main():
     parser.add_argument('--provider', type=str, required=True, 
                        choices=['openai', 'anthropic', 'google'],
                        help='Provider to use')
-    parser.add_argument('--input-path', type=str, required=True,
+    parser.add_argument('--input-path', type=str, default=None,
                        help='Path to input CSV file')
-    parser.add_argument('--output-path', type=str, required=True,
+    parser.add_argument('--output-path', type=str, default=None,
                        help='Path to output CSV file')
-    parser.add_argument('--input-column', type=str, required=True,
+    parser.add_argument('--input-column', type=str, default=None,
                        help='Column name containing input prompts')
     parser.add_argument('--output-column', type=str, required=True,
                        help='Column name for output results')
+    parser.add_argument('--paired', action='store_true',
+                       help='Run the focused and full conditions together under one token budget (use the --focused-*/--full-* options)')
+    parser.add_argument('--focused-input-path', type=str, default=None,
+                       help='Focused input CSV for --paired')
+    parser.add_argument('--focused-output-path', type=str, default=None,
+                       help='Focused output CSV for --paired')
+    parser.add_argument('--focused-input-column', type=str, default='focused_prompt',
+                       help='Column with the focused prompts (default: focused_prompt)')
+    parser.add_argument('--full-input-path', type=str, default=None,
+                       help='Full input CSV for --paired')
+    parser.add_argument('--full-output-path', type=str, default=None,
+                       help='Full output CSV for --paired')
+    parser.add_argument('--full-input-column', type=str, default='full_prompt',
+                       help='Column with the full prompts (default: full_prompt)')
     parser.add_argument('--model-name', type=str, required=True,
                        help='Model to run')
     parser.add_argument('--max-context-length', type=int, required=True,
                        help='Maximum context length in tokens')
     parser.add_argument('--max-tokens-per-minute', type=int, required=True,
                        help='Maximum tokens per minute for rate limits')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
     
     args = parser.parse_args()
     
     try:
         provider = get_provider(args.provider, args.model_name)
+
+        if args.paired:
+            if not (args.focused_input_path and args.focused_output_path and args.full_input_path and args.full_output_path):
+                raise ValueError("--paired needs --focused-input-path, --focused-output-path, --full-input-path and --full-output-path")
+
+            # Long full prompts open the batches and the short focused prompts fill the token budget they leave
+            provider.main_many(
+                jobs=[
+                    (args.focused_input_path, args.focused_output_path),
+                    (args.full_input_path, args.full_output_path),
+                ],
+                input_column=[args.focused_input_column, args.full_input_column],
+                output_column=args.output_column,
+                model_name=args.model_name,
+                max_context_length=args.max_context_length,
+                max_tokens_per_minute=args.max_tokens_per_minute,
+                trace_path=args.trace_path
+            )
+            return
+
+        if not (args.input_path and args.output_path and args.input_column):
+            raise ValueError("Pass --input-path, --output-path and --input-column, or --paired with the --focused-*/--full-* options")
         
         provider.main(
             input_path=args.input_path,
@@ -55,7 +93,8 @@ def main():
             output_column=args.output_column,
             model_name=args.model_name,
             max_context_length=args.max_context_length,
-            max_tokens_per_minute=args.max_tokens_per_minute
+            max_tokens_per_minute=args.max_tokens_per_minute,
+            trace_path=args.trace_path
         )
         
     except Exception as e:
@@ -0,0 +1,108 @@
+import json
+import pandas as pd
+import tiktoken
+
+TOKENIZER = "o200k_base"
+
+# LongMemEval's history-chats reading prompt. Every session block starts with "###" and ends with a blank line, and
+# the tail starts with a letter, so no token spans two pieces and a prompt's token count is the sum of its pieces
+PROMPT_HEAD = "I will give you several history chats between you and a user. Please answer the question based on the relevant chat history.\n\nHistory Chats:\n\n"
+SESSION_TEMPLATE = "### Session Date: {date}\n{turns}\n\n"
+PROMPT_TAIL = "Current Date: {question_date}\nQuestion: {question}\nAnswer:"
+
+
+def load_longmemeval(dataset_path: str) -> list[dict]:
+    with open(dataset_path) as f:
+        return json.load(f)
+
+
+def format_session(session: list[dict], date: str) -> str:
+    turns = "\n".join(f"{turn['role']}: {turn['content'].strip()}" for turn in session)
+    return SESSION_TEMPLATE.format(date=date, turns=turns)
+
+
+def session_text(session: list[dict]) -> str:
+    return "\n".join(turn['content'] for turn in session)
+
+
+# One question's prompt pieces (head, session blocks, tail), each encoded once, so prompts over any subset of
+# sessions are assembled and counted without encoding them again
+class SessionPrompts:
+    def __init__(self, entry: dict, encoding: tiktoken.Encoding):
+        self.entry = entry
+        self.encoding = encoding
+
+        # Sessions are kept in chronological order; ties keep the haystack order
+        self.order = sorted(range(len(entry['haystack_sessions'])), key=lambda i: entry['haystack_dates'][i])
+        self.blocks = [format_session(session, date) for session, date in zip(entry['haystack_sessions'], entry['haystack_dates'])]
+        self.tail = PROMPT_TAIL.format(question_date=entry['question_date'], question=entry['question'])
+
+        self.block_tokens = [len(self.encode(block)) for block in self.blocks]
+        self.overhead_tokens = len(self.encode(PROMPT_HEAD)) + len(self.encode(self.tail))
+
+        # One exact encoding of the full prompt confirms the sum; otherwise every prompt of this question is encoded
+        everything = list(range(len(self.blocks)))
+        self.linear = len(self.encode(self.prompt(everything))) == self.sum_tokens(everything)
+        if not self.linear:
+            print(f"Tokens span session boundaries for {entry['question_id']}, encoding its prompts exactly")
+
+        answer_session_ids = set(entry.get('answer_session_ids') or [])
+        self.evidence = [i for i, session_id in enumerate(entry['haystack_session_ids']) if session_id in answer_session_ids]
+
+    def encode(self, text: str) -> list[int]:
+        return self.encoding.encode(text, disallowed_special=())
+
+    def chronological(self, sessions: list[int]) -> list[int]:
+        selected = set(sessions)
+        return [i for i in self.order if i in selected]
+
+    def prompt(self, sessions: list[int]) -> str:
+        return PROMPT_HEAD + "".join(self.blocks[i] for i in self.chronological(sessions)) + self.tail
+
+    def sum_tokens(self, sessions: list[int]) -> int:
+        return self.overhead_tokens + sum(self.block_tokens[i] for i in sessions)
+
+    def token_count(self, sessions: list[int]) -> int:
+        if self.linear:
+            return self.sum_tokens(sessions)
+        return len(self.encode(self.prompt(sessions)))
+
+    def evidence_recall(self, sessions: list[int]) -> float:
+        if not self.evidence:
+            return float('nan')
+        return len(set(self.evidence) & set(sessions)) / len(self.evidence)
+
+
+def get_session_prompts(dataset_path: str) -> list[SessionPrompts]:
+    encoding = tiktoken.get_encoding(TOKENIZER)
+    return [SessionPrompts(entry, encoding) for entry in load_longmemeval(dataset_path)]
+
+
+def first_difference(a: str, b: str) -> int:
+    return next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+
+
+def check_full_prompts(session_prompts: list[SessionPrompts], cleaned_full_path: str) -> None:
+    # Every session rendered with this layout must reproduce the cleaned dataset's full_prompt, so that prompts built
+    # here are comparable with the focused and full conditions
+    cleaned_df = pd.read_csv(cleaned_full_path)
+    full_prompts = dict(zip(cleaned_df['question_id'], cleaned_df['full_prompt']))
+
+    checked = 0
+    mismatched = []
+    for prompts in session_prompts:
+        question_id = prompts.entry['question_id']
+        if question_id not in full_prompts:
+            continue
+        checked += 1
+        rendered = prompts.prompt(list(range(len(prompts.blocks))))
+        if rendered != full_prompts[question_id]:
+            mismatched.append((question_id, first_difference(rendered, full_prompts[question_id])))
+
+    if not checked:
+        raise ValueError(f"No dataset questions found in {cleaned_full_path}")
+    if mismatched:
+        question_id, position = mismatched[0]
+        raise ValueError(f"{len(mismatched)} of {checked} rendered prompts differ from full_prompt in {cleaned_full_path} "
+                         f"(first: {question_id} at character {position})")
+    print(f"All {checked} rendered prompts match full_prompt in {cleaned_full_path}")
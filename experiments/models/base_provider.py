@@ -1,13 +1,33 @@
 import pandas as pd
 import time
 import os
-from typing import Any
+import bisect
+import hashlib
+import threading
+from typing import Any, Callable
 import concurrent.futures
 from abc import ABC, abstractmethod
+from .usage import write_usage, report_usage
+from .tracing import Tracer, export_trace
+from .verdicts import VERDICT_MAX_OUTPUT_TOKENS, parse_verdict
 
 class BaseProvider(ABC):
+    # Local providers are not billed, so their estimated cost is zero instead of unknown
+    billed = True
+
+    # Rate limits are enforced per window: each batch fits the token budget and batches start at least one window apart
+    rate_limit_window = 60
+    request_overhead_seconds = 1.0
+    prefill_seconds_per_1k_tokens = 0.1
+    decode_seconds_per_1k_tokens = 10.0
+
     def __init__(self):
         self.client = self.get_client()
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.coalesced_count = 0
+        self.usage_local = threading.local()
+        self.tracer = Tracer()
 
     @abstractmethod
     def process_single_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int) -> tuple[int, str]:
@@ -17,48 +37,150 @@ class BaseProvider(ABC):
     def get_client(self) -> Any:
         pass
 
+    def record_usage(self, **usage: Any) -> None:
+        # Called from process_single_prompt; usage is per thread so concurrent requests don't mix
+        self.usage_local.usage = usage
+
+    def process_verdict_prompt(self, prompt: str, model_name: str, index: int) -> tuple[int, str, float | None]:
+        # Providers without structured outputs or logprobs fall back to a short free-form answer without a confidence
+        _, response = self.process_single_prompt(prompt=prompt, model_name=model_name, max_output_tokens=VERDICT_MAX_OUTPUT_TOKENS, index=index)
+        return index, parse_verdict(response), None
+
+    def process_streaming_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, guard: Callable[[str], str | None]) -> tuple[int, str, str | None]:
+        # The guard sees each streamed text chunk and returns a truncation reason to cancel the request; providers
+        # without streaming run the request to completion and never truncate
+        _, response = self.process_single_prompt(prompt=prompt, model_name=model_name, max_output_tokens=max_output_tokens, index=index)
+        return index, response, None
+
+    def process_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, constrained: bool = False, guard: Callable[[str], str | None] = None) -> tuple[int, str, dict]:
+        # Single-flight: identical requests that are in flight at the same time share one upstream call
+        key = hashlib.sha256(f"{model_name}\0{max_output_tokens}\0{constrained}\0{guard is not None}\0{prompt}".encode("utf-8")).hexdigest()
+
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = concurrent.futures.Future()
+                self.in_flight[key] = future
+            else:
+                self.coalesced_count += 1
+
+        if not is_leader:
+            _, response, details = future.result()
+            return index, response, {"coalesced": 1, **details}
+
+        self.usage_local.usage = {}
+        try:
+            details = {"confidence": None, "truncation_reason": None}
+            if constrained:
+                _, response, details["confidence"] = self.process_verdict_prompt(prompt=prompt, model_name=model_name, index=index)
+            elif guard is not None:
+                _, response, details["truncation_reason"] = self.process_streaming_prompt(prompt=prompt, model_name=model_name, max_output_tokens=max_output_tokens, index=index, guard=guard)
+            else:
+                _, response = self.process_single_prompt(prompt=prompt, model_name=model_name, max_output_tokens=max_output_tokens, index=index)
+            # The confidence and truncation reason travel with the usage but are not usage columns; callers write them separately
+            usage = {**self.usage_local.usage, "coalesced": 0, **details}
+            future.set_result((index, response, details))
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+
+        return index, response, usage
+
+    def get_span_args(self, input_df: pd.DataFrame, idx: int, model_name: str) -> dict:
+        span_args = {"row": int(idx), "provider": type(self).__name__, "model": model_name}
+        for column in ["token_count", "approximate_input_length"]:
+            if column in input_df.columns and pd.notna(input_df.loc[idx, column]):
+                span_args[column] = int(input_df.loc[idx, column])
+        return span_args
+
+    def traced_process_prompt(self, submitted_at: float, span_args: dict, **prompt_kwargs: Any) -> tuple[int, str, dict]:
+        # Time between submission and a worker picking the row up is queueing, the rest is the upstream call
+        self.tracer.add_span("queue", "queue", submitted_at, time.perf_counter(), **span_args)
+        with self.tracer.span("request", "network", **span_args):
+            return self.process_prompt(**prompt_kwargs)
+
     def create_batches(self, df: pd.DataFrame, max_tokens_per_minute: int) -> list[list[int]]:
-        indices = df.index.tolist()
-        token_counts = df['token_count'].tolist()
-        
+        # Best-fit decreasing: the longest rows open batches first (shortest makespan), short rows fill leftover budget
+        rows = sorted(zip(df.index.tolist(), df['token_count'].tolist()), key=lambda row: row[1], reverse=True)
+
         batches = []
-        current_batch = []
-        current_tokens = 0
-        
-        for idx, tokens in zip(indices, token_counts):
+        open_batches = []  # sorted (remaining_tokens, batch_number) for batches that can still take rows
+
+        for idx, tokens in rows:
             if tokens > max_tokens_per_minute:
-                if current_batch:
-                    batches.append(current_batch)
-                    current_batch = []
-                    current_tokens = 0
-                
                 batches.append([idx])
                 continue
-            
-            if current_tokens + tokens > max_tokens_per_minute and current_batch:
-                batches.append(current_batch)
-                current_batch = []
-                current_tokens = 0
-            
-            current_batch.append(idx)
-            current_tokens += tokens
-        
-        if current_batch:
-            batches.append(current_batch)
-        
+
+            position = bisect.bisect_left(open_batches, (tokens, -1))
+            if position < len(open_batches):
+                remaining, batch_number = open_batches.pop(position)
+            else:
+                remaining, batch_number = max_tokens_per_minute, len(batches)
+                batches.append([])
+
+            batches[batch_number].append(idx)
+            if remaining - tokens > 0:
+                bisect.insort(open_batches, (remaining - tokens, batch_number))
+
         return batches
 
-    def process_batch(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], model_name: str, output_path: str, input_column: str, output_column: str) -> None:
+    def estimate_request_seconds(self, token_count: int, max_output_tokens: int) -> float:
+        # Rough latency model (fixed overhead + prefill + worst-case decode) used only for the runtime prediction
+        return self.request_overhead_seconds + token_count / 1000 * self.prefill_seconds_per_1k_tokens + max_output_tokens / 1000 * self.decode_seconds_per_1k_tokens
+
+    def predict_runtime(self, df: pd.DataFrame, batches: list[list[int]]) -> float:
+        max_output_tokens = df['max_output_tokens'] if 'max_output_tokens' in df.columns else pd.Series(1000, index=df.index)
+
+        predicted = 0.0
+        for i, batch_indices in enumerate(batches):
+            batch_seconds = max(
+                self.estimate_request_seconds(int(df.loc[idx, 'token_count']), int(max_output_tokens.loc[idx]))
+                for idx in batch_indices
+            )
+            predicted += batch_seconds if i == len(batches) - 1 else max(batch_seconds, self.rate_limit_window)
+        return predicted
+
+    def run_batches(self, df: pd.DataFrame, batches: list[list[int]], process_batch: Callable[[list[int]], None]) -> float:
+        predicted = self.predict_runtime(df, batches)
+        print(f"Predicted runtime: {predicted / 60:.1f} min for {len(batches)} batches")
+
+        start_time = time.time()
+        for i, batch_indices in enumerate(batches):
+            batch_start = time.time()
+            with self.tracer.span("batch", "batch", batch=i, rows=len(batch_indices)):
+                process_batch(batch_indices)
+
+            if i < len(batches) - 1:
+                # The next batch only has to start one window after this one started, not a full window after it ended
+                wait_seconds = self.rate_limit_window - (time.time() - batch_start)
+                if wait_seconds > 0:
+                    print(f"Waiting {wait_seconds:.0f} seconds")
+                    with self.tracer.span("rate_limit_wait", "rate_limit", batch=i):
+                        time.sleep(wait_seconds)
+
+        elapsed = time.time() - start_time
+        print(f"Runtime: {elapsed / 60:.1f} min actual vs {predicted / 60:.1f} min predicted")
+        return elapsed
+
+    def process_batch(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], model_name: str, output_path: str, input_column: str, output_column: str, on_result: Callable[[int, pd.DataFrame], None] = None, stream_guard: Callable[[pd.Series], Callable[[str], str | None]] = None) -> None:
+        # stream_guard builds a fresh guard from each input row; guarded rows are streamed and may be cut short
         timeout_per_request = 500
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=len(indices_to_process)) as executor:
             futures = {
                 executor.submit(
-                    self.process_single_prompt, 
+                    self.traced_process_prompt,
+                    time.perf_counter(),
+                    self.get_span_args(input_df, idx, model_name),
                     prompt=str(input_df.loc[idx, input_column]), 
                     model_name=model_name,
                     max_output_tokens=int(input_df.loc[idx, 'max_output_tokens']) if 'max_output_tokens' in input_df.columns else 1000,
                     index=int(idx),
+                    guard=stream_guard(input_df.loc[idx]) if stream_guard is not None else None,
                 ): idx 
                 for idx in indices_to_process
             }
@@ -66,12 +188,18 @@ class BaseProvider(ABC):
             for future in futures:
                 idx = futures[future]
                 try:
-                    idx_result, response = future.result(timeout=timeout_per_request)
+                    idx_result, response, usage = future.result(timeout=timeout_per_request)
                     output_df.loc[idx_result, output_column] = response
+                    write_usage(output_df, idx_result, output_column, usage)
+                    if stream_guard is not None:
+                        output_df.loc[idx_result, f"{output_column}_truncation_reason"] = usage.get("truncation_reason")
                     
                     success = not response.startswith('ERROR')
                     status = "Success" if success else "Error"
                     print(f"{status} - Row {idx_result}: {response}...")
+
+                    if on_result is not None:
+                        on_result(idx_result, output_df)
                     
                 except concurrent.futures.TimeoutError:
                     print(f"Row {idx}: Request timed out after {timeout_per_request}s - marking as timeout error")
@@ -81,7 +209,8 @@ class BaseProvider(ABC):
                     output_df.loc[idx, output_column] = f"FUTURE_ERROR: {str(e)}"
                     print(f"Error - Row {idx}: Future error: {e}")
         
-        output_df.to_csv(output_path, index=False)
+        with self.tracer.span("persist", "persistence", rows=len(indices_to_process)):
+            output_df.to_csv(output_path, index=False)
         
         completed_in_batch = len([idx for idx in indices_to_process if not pd.isna(output_df.loc[idx, output_column])])
         total_completed = (~output_df[output_column].isna() & 
@@ -89,13 +218,16 @@ class BaseProvider(ABC):
         
         print(f"Saved progress: {completed_in_batch}/{len(indices_to_process)} in this batch")
         print(f"Overall progress: {total_completed}/{len(output_df)} ({total_completed/len(output_df)*100:.1f}%)")
-        output_df.to_csv(output_path, index=False)
+        with self.tracer.span("persist", "persistence", rows=len(output_df)):
+            output_df.to_csv(output_path, index=False)
         
         print(f"Results saved to: {output_path}")
         print(f"Successful: {total_completed}")
         print(f"Errors/Missing: {len(output_df) - total_completed}")
+        if self.coalesced_count:
+            print(f"Coalesced duplicate requests: {self.coalesced_count}")
 
-    def main(self, input_path: str, output_path: str, input_column: str, output_column: str, model_name: str, max_context_length: int, max_tokens_per_minute: int) -> None:
+    def load_pending(self, input_path: str, output_path: str, input_column: str, output_column: str, max_context_length: int) -> tuple[pd.DataFrame, pd.DataFrame, list[int]]:
         input_df = pd.read_csv(input_path)
 
         input_df_filtered = input_df[input_df['token_count'] <= max_context_length].copy()
@@ -120,7 +252,11 @@ class BaseProvider(ABC):
         
         if to_process:
             print(f"{len(to_process)} rows needing processing: {to_process[0]} to {to_process[-1]}")
-        else:
+        return input_df_filtered, output_df, to_process
+
+    def main(self, input_path: str, output_path: str, input_column: str, output_column: str, model_name: str, max_context_length: int, max_tokens_per_minute: int, trace_path: str = None, on_result: Callable[[int, pd.DataFrame], None] = None, stream_guard: Callable[[pd.Series], Callable[[str], str | None]] = None) -> None:
+        input_df_filtered, output_df, to_process = self.load_pending(input_path, output_path, input_column, output_column, max_context_length)
+        if not to_process:
             print("All rows already processed successfully")
             return
             
@@ -128,8 +264,68 @@ class BaseProvider(ABC):
         batches = self.create_batches(input_to_process, max_tokens_per_minute)
         print(f"Created {len(batches)} batches based on {max_tokens_per_minute:,} tokens/minute")
         
-        for i, batch_indices in enumerate(batches):
-            self.process_batch(input_to_process, output_df, batch_indices, model_name, output_path, input_column, output_column)
-            if i < len(batches) - 1:
-                print("Waiting 60 seconds")
-                time.sleep(60)
\ No newline at end of file
+        elapsed = self.run_batches(
+            input_to_process,
+            batches,
+            lambda batch_indices: self.process_batch(input_to_process, output_df, batch_indices, model_name, output_path, input_column, output_column, on_result, stream_guard),
+        )
+
+        output_df.to_csv(output_path, index=False)
+        report_usage(output_df, to_process, output_column, model_name, elapsed, output_path, self.billed)
+        if trace_path:
+            export_trace(self.tracer, trace_path)
+
+    def main_many(self, jobs: list[tuple[str, str]], input_column: str | list[str], output_column: str, model_name: str, max_context_length: int, max_tokens_per_minute: int, trace_path: str = None, stream_guard: Callable[[pd.Series], Callable[[str], str | None]] = None) -> None:
+        # Pending rows of every (input_path, output_path) job share one batch schedule, so the window sleeps are paid once.
+        # input_column is shared by all jobs or given per job (e.g. focused_prompt and full_prompt)
+        input_columns = [input_column] * len(jobs) if isinstance(input_column, str) else input_column
+        if len(input_columns) != len(jobs):
+            raise ValueError(f"Got {len(input_columns)} input columns for {len(jobs)} jobs")
+
+        input_dfs, output_dfs, to_process_by_job = [], [], []
+        for (input_path, output_path), job_input_column in zip(jobs, input_columns):
+            input_df_filtered, output_df, to_process = self.load_pending(input_path, output_path, job_input_column, output_column, max_context_length)
+            input_dfs.append(input_df_filtered)
+            output_dfs.append(output_df)
+            to_process_by_job.append(to_process)
+
+        if not any(to_process_by_job):
+            print("All rows already processed successfully")
+            return
+
+        # Only what the scheduler needs, indexed by (job, row): real token counts and output limits (1000 where a file has none)
+        pool_df = pd.concat(
+            [
+                input_df.loc[to_process, ['token_count']].assign(
+                    max_output_tokens=input_df.loc[to_process, 'max_output_tokens'] if 'max_output_tokens' in input_df.columns else 1000
+                )
+                for input_df, to_process in zip(input_dfs, to_process_by_job)
+            ],
+            keys=range(len(jobs)),
+            names=["job", "row"],
+        )
+        batches = self.create_batches(pool_df, max_tokens_per_minute)
+        print(f"Created {len(batches)} batches for {len(pool_df)} rows from {len(jobs)} files based on {max_tokens_per_minute:,} tokens/minute")
+
+        def process_pooled_batch(batch: list[tuple[int, int]]) -> None:
+            rows_by_job = {}
+            for job, idx in batch:
+                rows_by_job.setdefault(job, []).append(idx)
+
+            # Each file's share of the batch runs concurrently and is saved to its own output
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(rows_by_job)) as executor:
+                futures = [
+                    executor.submit(self.process_batch, input_dfs[job], output_dfs[job], indices, model_name, jobs[job][1], input_columns[job], output_column, None, stream_guard)
+                    for job, indices in rows_by_job.items()
+                ]
+                for future in futures:
+                    future.result()
+
+        elapsed = self.run_batches(pool_df, batches, process_pooled_batch)
+
+        for (_, output_path), output_df, to_process in zip(jobs, output_dfs, to_process_by_job):
+            output_df.to_csv(output_path, index=False)
+            if to_process:
+                report_usage(output_df, to_process, output_column, model_name, elapsed, output_path, self.billed)
+        if trace_path:
+            export_trace(self.tracer, trace_path)
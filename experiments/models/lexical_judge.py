@@ -0,0 +1,184 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+import Levenshtein
+
+# Scores at or above the pass threshold are judged true; the rest go to the LLM judge. Low scores are only judged false with a
+# fail threshold calibrated on already-judged rows, since a correct answer can share no words with the expected one ("4" vs "four bikes")
+DEFAULT_PASS_THRESHOLD = 0.9
+
+# Short answers ("3", "yes") appear in unrelated outputs too, so containment alone is only trusted above this length, and a
+# non-empty output is never judged false for missing them
+MIN_CONTAINMENT_TOKENS = 3
+
+# Number words are written as digits before scoring, so "seven" matches "7" and "twenty-five" matches "25"
+NUMBER_WORDS = {
+    word: value for value, word in enumerate([
+        "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+        "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+    ])
+}
+TENS_WORDS = {word: value for value, word in zip(range(20, 100, 10), ["twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"])}
+
+# Outputs whose closest window is at least this similar to a distractor phrase it doesn't contain are left to the LLM
+DISTRACTOR_SIMILARITY_THRESHOLD = 0.8
+
+# The distractor prompt answers -1 for hedged or multiple picks, so any of these sends the row to the LLM instead
+HEDGE_WORDS = {
+    "however", "but", "although", "though", "whereas", "or", "either", "maybe", "perhaps", "possibly", "might",
+    "unclear", "unsure", "uncertain", "inconsistent", "inconsistency", "inconsistencies", "conflicting", "contradictory",
+}
+
+
+def numbers_to_digits(tokens: list[str]) -> list[str]:
+    digits = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in TENS_WORDS:
+            value = TENS_WORDS[token]
+            if i + 1 < len(tokens) and 0 < NUMBER_WORDS.get(tokens[i + 1], 0) < 10:
+                value += NUMBER_WORDS[tokens[i + 1]]
+                i += 1
+            digits.append(str(value))
+        elif token in NUMBER_WORDS:
+            digits.append(str(NUMBER_WORDS[token]))
+        else:
+            digits.append(token)
+        i += 1
+    return digits
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = re.sub(r"[‘’]", "'", text)
+    text = re.sub(r"[“”]", '"', text)
+    text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text)
+    text = re.sub(r"[^\w\s']", " ", text)
+    return " ".join(numbers_to_digits(text.split()))
+
+
+def tokenize(text: str) -> list[str]:
+    return normalize_text(text).split()
+
+
+def score_output(output: str, answer: str) -> dict:
+    if pd.isna(output) or pd.isna(answer) or not str(output).strip():
+        return {"containment": 0.0, "token_overlap": 0.0, "fuzzy_ratio": 0.0, "score": 0.0}
+
+    normalized_output = normalize_text(output)
+    normalized_answer = normalize_text(answer)
+    answer_tokens = normalized_answer.split()
+    output_tokens = set(normalized_output.split())
+
+    contained = f" {normalized_answer} " in f" {normalized_output} "
+    containment = 1.0 if contained and len(answer_tokens) >= MIN_CONTAINMENT_TOKENS else 0.0
+    token_overlap = sum(token in output_tokens for token in answer_tokens) / len(answer_tokens) if answer_tokens else 0.0
+    fuzzy_ratio = Levenshtein.ratio(normalized_answer, normalized_output)
+
+    return {
+        "containment": containment,
+        "token_overlap": token_overlap,
+        "fuzzy_ratio": fuzzy_ratio,
+        "score": max(containment, (token_overlap + fuzzy_ratio) / 2),
+    }
+
+
+def can_fast_fail(output: str, answer: str) -> bool:
+    # An empty output is always wrong; otherwise only answers long enough that no overlap means a different answer
+    if pd.isna(output) or not str(output).strip():
+        return True
+    return not pd.isna(answer) and len(tokenize(answer)) >= MIN_CONTAINMENT_TOKENS
+
+
+def prejudge(output: str, answer: str, pass_threshold: float = DEFAULT_PASS_THRESHOLD, fail_threshold: float | None = None) -> bool | None:
+    score = score_output(output, answer)["score"]
+    if score >= pass_threshold:
+        return True
+    if fail_threshold is not None and score <= fail_threshold and can_fast_fail(output, answer):
+        return False
+    return None
+
+
+def phrase_similarity(normalized_output: str, normalized_phrase: str) -> float:
+    # Best Levenshtein ratio between the phrase and any window of the output with the same number of tokens
+    output_tokens = normalized_output.split()
+    width = len(normalized_phrase.split())
+    windows = [" ".join(output_tokens[i:i + width]) for i in range(max(1, len(output_tokens) - width + 1))]
+    return max(Levenshtein.ratio(normalized_phrase, window) for window in windows)
+
+
+def match_distractor(output: str, phrases: list[str], similarity_threshold: float = DISTRACTOR_SIMILARITY_THRESHOLD) -> int | None:
+    # Index of the only distractor phrase in the output, -1 if the output is clearly unrelated to all of them, None if unsure
+    if pd.isna(output) or not str(output).strip():
+        return None
+
+    normalized_output = normalize_text(output)
+    if HEDGE_WORDS.intersection(normalized_output.split()):
+        return None
+
+    normalized_phrases = [normalize_text(phrase) for phrase in phrases]
+    contained = [i for i, phrase in enumerate(normalized_phrases) if f" {phrase} " in f" {normalized_output} "]
+
+    # Sibling phrases differ by a single word, so the matched phrases are cut out before looking for near-misses of the others
+    remainder = f" {normalized_output} "
+    for i in contained:
+        remainder = remainder.replace(f" {normalized_phrases[i]} ", " | ")
+    remainder_tokens = set(remainder.split())
+
+    similar = []
+    for i, phrase in enumerate(normalized_phrases):
+        if i in contained:
+            continue
+        # Words that only this phrase uses ("three", "everyday") are a near-miss on their own
+        other_tokens = set().union(*(normalized_phrases[j].split() for j in range(len(phrases)) if j != i))
+        unique_tokens = set(phrase.split()) - other_tokens
+        if unique_tokens & remainder_tokens or phrase_similarity(remainder.strip(), phrase) >= similarity_threshold:
+            similar.append(i)
+
+    if len(contained) == 1 and not similar:
+        return contained[0]
+    if not contained and not similar:
+        return -1
+    return None
+
+
+def judge_to_bool(value) -> bool | None:
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    text = str(value).strip().strip("*.\"' ").lower()
+    if text in ("true", "false"):
+        return text == "true"
+    return None
+
+
+def calibrate_thresholds(evaluated_df: pd.DataFrame, output_column: str = "output", answer_column: str = "answer", judge_column: str = "llm_judge_output", target_precision: float = 0.99) -> tuple[float, float]:
+    labels = evaluated_df[judge_column].map(judge_to_bool)
+    df = evaluated_df[labels.notna()]
+    labels = labels[labels.notna()].astype(bool).to_numpy()
+    scores = np.array([score_output(output, answer)["score"] for output, answer in zip(df[output_column], df[answer_column])])
+    failable = np.array([can_fast_fail(output, answer) for output, answer in zip(df[output_column], df[answer_column])], dtype=bool)
+
+    # Lowest pass threshold whose fast-path passes agree with the LLM judge at the target precision
+    pass_threshold = np.inf
+    for threshold in np.unique(scores)[::-1]:
+        selected = scores >= threshold
+        if labels[selected].mean() < target_precision:
+            break
+        pass_threshold = threshold
+
+    # Highest fail threshold whose fast-path fails agree with the LLM judge at the target precision, over the rows prejudge may fail
+    fail_threshold = -np.inf
+    for threshold in np.unique(scores[failable]):
+        selected = failable & (scores <= threshold)
+        if (~labels[selected]).mean() < target_precision:
+            break
+        fail_threshold = threshold
+
+    passed = (scores >= pass_threshold).sum()
+    failed = (failable & (scores <= fail_threshold)).sum()
+    print(f"Calibrated on {len(scores)} judged rows: pass >= {pass_threshold:.3f} ({passed} rows), fail <= {fail_threshold:.3f} ({failed} rows), "
+          f"{len(scores) - passed - failed} rows ({(len(scores) - passed - failed) / max(len(scores), 1) * 100:.1f}%) left for the LLM judge")
+
+    return float(pass_threshold), float(fail_threshold)
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import os
 import json
 from .providers.openai import OpenAIProvider
@@ -6,17 +7,55 @@ from .providers.anthropic import AnthropicProvider
 from .providers.google import GoogleProvider
 from .providers.ollama import OllamaProvider
 import time
+import queue
+import threading
 import concurrent.futures
+from .usage import write_usage, report_usage
+from .tracing import export_trace
+from .lexical_judge import prejudge, judge_to_bool, match_distractor
+from .verdict_store import VerdictStore, hash_template
+from .verdicts import VERDICT_SCHEMA
+
+BATCH_JUDGE_PROMPT = """
+You will judge {count} items independently, each with the same criteria below. In the criteria, the question, correct answer and response refer to the fields of the item being judged.
+
+Criteria:
+{criteria}
+
+Items (JSON):
+{items}
+
+Instructions: Respond with only a JSON array that contains exactly one object per item, in the same order, of the form {{"id": <item id>, "verdict": true or false}}. Do not provide any other text.
+"""
+
+FUSED_JUDGE_PROMPT = """
+Judge the response with the criteria below, but answer in the JSON format given at the end instead of the format the criteria ask for.
+
+Criteria:
+{criteria}
+
+If the response is not correct, also decide which of these options it gives instead:
+{distractors}
+
+Choose the option that most closely aligns, or -1 if none align, if multiple options are mentioned, or if there is any hesitation (e.g. "however") or mention of inconsistency in the document. Use -1 for correct responses.
+
+Instructions: Respond with only a JSON object of the form {{"verdict": true or false, "distractor": <option number or -1>}}. Do not provide any other text.
+"""
 
 class LLMJudge:
-    def __init__(self, prompt: str, model_name: str = "gpt-4.1-2025-04-14", output_column: str = "output", question_column: str = "question", correct_answer_column: str = "answer", distractors_file: str = None, provider: str = "openai"):
+    def __init__(self, prompt: str, model_name: str = "gpt-4.1-2025-04-14", output_column: str = "output", question_column: str = "question", correct_answer_column: str = "answer", distractors_file: str = None, provider: str = "openai", verdict_store_path: str = None):
         self.prompt = prompt
         self.model_name = model_name
         self.output_column = output_column
         self.question_column = question_column
         self.correct_answer_column = correct_answer_column
         self.provider = self._get_provider(provider)
-        self.distractors_text = self._load_distractors(distractors_file) if distractors_file else ""
+        self.distractor_phrases = self._load_distractor_phrases(distractors_file) if distractors_file else []
+        self.distractors_text = self._format_distractors(self.distractor_phrases)
+        self.verdict_store = VerdictStore(verdict_store_path) if verdict_store_path else None
+        self.template_hash = hash_template(self.prompt + "\0" + self.distractors_text)
+        # Constrained verdicts come from a different request than free-form ones, so they are stored separately
+        self.constrained_template_hash = hash_template(self.prompt + "\0" + self.distractors_text + "\0" + json.dumps(VERDICT_SCHEMA, sort_keys=True))
 
     def _get_provider(self, provider_name: str):
         """Get the appropriate provider instance based on provider name."""
@@ -31,7 +70,7 @@ class LLMJudge:
             raise ValueError(f"Unknown provider: {provider_name}. Available providers: {list(providers.keys())}")
         return provider_class()
     
-    def _load_distractors(self, distractors_file: str) -> str:
+    def _load_distractor_phrases(self, distractors_file: str) -> list[str]:
         with open(distractors_file, 'r') as f:
             distractors_data = json.load(f)
         
@@ -40,6 +79,9 @@ class LLMJudge:
             distractor_text = distractors_data[key]["rewrite_for_analysis"]
             distractors_list.append(distractor_text)
         
+        return distractors_list
+
+    def _format_distractors(self, distractors_list: list[str]) -> str:
         formatted_distractors = []
         for i, distractor in enumerate(distractors_list):
             formatted_distractors.append(f"{i}. {distractor}")
@@ -52,13 +94,15 @@ class LLMJudge:
         else:
             return self.prompt.format(output=output_value, question=question, correct_answer=correct_answer)
     
-    def _process_for_evaluation(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], output_path: str, output_column_name: str = "llm_judge_output") -> None:
+    def _process_for_evaluation(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], output_path: str, output_column_name: str = "llm_judge_output", constrained: bool = False) -> None:
         timeout_per_request = 500
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=len(indices_to_process)) as executor:
             futures = {
                 executor.submit(
-                    self.provider.process_single_prompt,
+                    self.provider.traced_process_prompt,
+                    time.perf_counter(),
+                    self.provider.get_span_args(input_df, idx, self.model_name),
                     prompt=self._format_prompt(
                         str(input_df.loc[idx, self.output_column]),
                         str(input_df.loc[idx, self.question_column]),
@@ -67,6 +111,7 @@ class LLMJudge:
                     model_name=self.model_name,
                     max_output_tokens=100,
                     index=int(idx),
+                    constrained=constrained,
                 ): idx 
                 for idx in indices_to_process
             }
@@ -74,8 +119,11 @@ class LLMJudge:
             for future in futures:
                 idx = futures[future]
                 try:
-                    idx_result, response = future.result(timeout=timeout_per_request)
+                    idx_result, response, usage = future.result(timeout=timeout_per_request)
                     output_df.loc[idx_result, output_column_name] = response
+                    write_usage(output_df, idx_result, output_column_name, usage)
+                    if constrained and usage.get("confidence") is not None:
+                        output_df.loc[idx_result, f"{output_column_name}_confidence"] = usage["confidence"]
                     
                     success = not response.startswith('ERROR')
                     status = "Success" if success else "Error"
@@ -89,7 +137,12 @@ class LLMJudge:
                     output_df.loc[idx, output_column_name] = f"FUTURE_ERROR: {str(e)}"
                     print(f"Error Row {idx}: Future error: {e}")
         
-        output_df.to_csv(output_path, index=False)
+        self._remember_verdicts(input_df, output_df, indices_to_process, output_column_name, constrained)
+        self._save_progress(output_df, indices_to_process, output_path, output_column_name)
+
+    def _save_progress(self, output_df: pd.DataFrame, indices_to_process: list[int], output_path: str, output_column_name: str) -> None:
+        with self.provider.tracer.span("persist", "persistence", rows=len(indices_to_process)):
+            output_df.to_csv(output_path, index=False)
         
         completed_in_batch = len([idx for idx in indices_to_process if not pd.isna(output_df.loc[idx, output_column_name])])
         total_completed = (~output_df[output_column_name].isna() & 
@@ -101,8 +154,274 @@ class LLMJudge:
         print(f"Results saved to: {output_path}")
         print(f"Successful: {total_completed}")
         print(f"Errors/Missing: {len(output_df) - total_completed}")
+        if self.provider.coalesced_count:
+            print(f"Coalesced duplicate judge requests: {self.provider.coalesced_count}")
     
-    def evaluate(self, input_path: str, output_path: str, max_context_length: int, max_tokens_per_minute: int, output_column_name: str = "llm_judge_output") -> None:
+    def _format_batch_prompt(self, input_df: pd.DataFrame, indices: list[int]) -> str:
+        criteria = self._format_prompt("<response of the item>", "<question of the item>", "<correct answer of the item>")
+        items = [
+            {
+                "id": int(idx),
+                "question": str(input_df.loc[idx, self.question_column]),
+                "correct_answer": str(input_df.loc[idx, self.correct_answer_column]),
+                "response": str(input_df.loc[idx, self.output_column]),
+            }
+            for idx in indices
+        ]
+        return BATCH_JUDGE_PROMPT.format(count=len(items), criteria=criteria.strip(), items=json.dumps(items, ensure_ascii=False, indent=1))
+
+    def _parse_batch_verdicts(self, response: str, indices: list[int]) -> dict[int, str] | None:
+        start, end = response.find("["), response.rfind("]")
+        if start == -1 or end <= start:
+            return None
+        try:
+            verdicts = json.loads(response[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+
+        if not isinstance(verdicts, list) or len(verdicts) != len(indices):
+            return None
+
+        parsed = {}
+        for verdict in verdicts:
+            if not isinstance(verdict, dict) or not isinstance(verdict.get("id"), int):
+                return None
+            value = judge_to_bool(verdict.get("verdict"))
+            if value is None:
+                return None
+            parsed[verdict["id"]] = "true" if value else "false"
+
+        if set(parsed) != {int(idx) for idx in indices}:
+            return None
+        return parsed
+
+    def _judge_items(self, input_df: pd.DataFrame, indices: list[int]) -> tuple[dict[int, str], list[dict]]:
+        if len(indices) == 1:
+            idx = indices[0]
+            prompt = self._format_prompt(str(input_df.loc[idx, self.output_column]), str(input_df.loc[idx, self.question_column]), str(input_df.loc[idx, self.correct_answer_column]))
+            _, response, usage = self.provider.traced_process_prompt(
+                time.perf_counter(),
+                self.provider.get_span_args(input_df, idx, self.model_name),
+                prompt=prompt,
+                model_name=self.model_name,
+                max_output_tokens=100,
+                index=int(idx),
+            )
+            return {int(idx): response}, [usage]
+
+        _, response, usage = self.provider.traced_process_prompt(
+            time.perf_counter(),
+            {"rows": len(indices), "provider": type(self.provider).__name__, "model": self.model_name},
+            prompt=self._format_batch_prompt(input_df, indices),
+            model_name=self.model_name,
+            max_output_tokens=20 * len(indices) + 50,
+            index=int(indices[0]),
+        )
+
+        # A failed request (e.g. the provider is down) would fail again for every half, so the error goes to the whole chunk
+        if response.startswith('ERROR'):
+            return {int(idx): response for idx in indices}, [usage]
+
+        verdicts = self._parse_batch_verdicts(response, indices)
+        if verdicts is not None:
+            return verdicts, [usage]
+
+        # Invalid or incomplete array: split in half and retry, down to the single-item prompt
+        print(f"Could not parse verdicts for {len(indices)} items, splitting and retrying")
+        middle = len(indices) // 2
+        left_verdicts, left_usage = self._judge_items(input_df, indices[:middle])
+        right_verdicts, right_usage = self._judge_items(input_df, indices[middle:])
+        return {**left_verdicts, **right_verdicts}, [usage] + left_usage + right_usage
+
+    def _process_batched_evaluation(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], output_path: str, judge_batch_size: int, output_column_name: str = "llm_judge_output") -> None:
+        timeout_per_request = 500
+        chunks = [indices_to_process[i:i + judge_batch_size] for i in range(0, len(indices_to_process), judge_batch_size)]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = {executor.submit(self._judge_items, input_df, chunk): chunk for chunk in chunks}
+
+            for future in futures:
+                chunk = futures[future]
+                try:
+                    verdicts, usages = future.result(timeout=timeout_per_request)
+
+                    # Tokens of a multi-item call are spread evenly over its rows so per-run totals stay exact
+                    for field in ["prompt_tokens", "cached_tokens", "completion_tokens"]:
+                        total = sum(usage.get(field) or 0 for usage in usages)
+                        for idx in chunk:
+                            write_usage(output_df, idx, output_column_name, {field: total / len(chunk)})
+
+                    for idx in chunk:
+                        output_df.loc[idx, output_column_name] = verdicts[int(idx)]
+                    print(f"Success Rows {chunk[0]}-{chunk[-1]}: {len(chunk)} verdicts")
+
+                except concurrent.futures.TimeoutError:
+                    print(f"Rows {chunk[0]}-{chunk[-1]}: Request timed out after {timeout_per_request}s - marking as timeout error")
+                    for idx in chunk:
+                        output_df.loc[idx, output_column_name] = f"ERROR_TIMEOUT: Request exceeded {timeout_per_request}s"
+
+                except Exception as e:
+                    for idx in chunk:
+                        output_df.loc[idx, output_column_name] = f"FUTURE_ERROR: {str(e)}"
+                    print(f"Error Rows {chunk[0]}-{chunk[-1]}: Future error: {e}")
+
+        self._remember_verdicts(input_df, output_df, indices_to_process, output_column_name)
+        self._save_progress(output_df, indices_to_process, output_path, output_column_name)
+
+    def _format_fused_prompt(self, output_value: str, question: str, correct_answer: str) -> str:
+        criteria = self.prompt.format(output=output_value, question=question, correct_answer=correct_answer, distractors=self.distractors_text)
+        return FUSED_JUDGE_PROMPT.format(criteria=criteria.strip(), distractors=self.distractors_text)
+
+    def _parse_fused_response(self, response: str) -> tuple[str, str] | None:
+        start, end = response.find("{"), response.rfind("}")
+        if start == -1 or end <= start:
+            return None
+        try:
+            parsed = json.loads(response[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+
+        verdict = judge_to_bool(parsed.get("verdict")) if isinstance(parsed, dict) else None
+        if verdict is None:
+            return None
+        if verdict:
+            return "true", None
+
+        distractor = parsed.get("distractor")
+        if isinstance(distractor, str) and distractor.strip().lstrip("-").isdigit():
+            distractor = int(distractor)
+        if not isinstance(distractor, int) or isinstance(distractor, bool) or not -1 <= distractor < len(self.distractor_phrases):
+            return None
+        return "false", str(distractor)
+
+    def _process_fused_evaluation(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], output_path: str, output_column_name: str, distractor_column_name: str) -> None:
+        timeout_per_request = 500
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(indices_to_process)) as executor:
+            futures = {
+                executor.submit(
+                    self.provider.traced_process_prompt,
+                    time.perf_counter(),
+                    self.provider.get_span_args(input_df, idx, self.model_name),
+                    prompt=self._format_fused_prompt(
+                        str(input_df.loc[idx, self.output_column]),
+                        str(input_df.loc[idx, self.question_column]),
+                        str(input_df.loc[idx, self.correct_answer_column])
+                    ),
+                    model_name=self.model_name,
+                    max_output_tokens=100,
+                    index=int(idx),
+                ): idx
+                for idx in indices_to_process
+            }
+
+            for future in futures:
+                idx = futures[future]
+                try:
+                    idx_result, response, usage = future.result(timeout=timeout_per_request)
+                    write_usage(output_df, idx_result, output_column_name, usage)
+
+                    parsed = None if response.startswith('ERROR') else self._parse_fused_response(response)
+                    if parsed is None:
+                        output_df.loc[idx_result, output_column_name] = response if response.startswith('ERROR') else f"ERROR_UNPARSEABLE_FUSED: {response}"
+                        print(f"Error Row {idx_result}: {response}...")
+                        continue
+
+                    verdict, distractor = parsed
+                    output_df.loc[idx_result, output_column_name] = verdict
+                    output_df.loc[idx_result, distractor_column_name] = distractor
+                    print(f"Success Row {idx_result}: {verdict}, distractor {distractor}")
+
+                except concurrent.futures.TimeoutError:
+                    print(f"Row {idx}: Request timed out after {timeout_per_request}s - marking as timeout error")
+                    output_df.loc[idx, output_column_name] = f"ERROR_TIMEOUT: Request exceeded {timeout_per_request}s"
+
+                except Exception as e:
+                    output_df.loc[idx, output_column_name] = f"FUTURE_ERROR: {str(e)}"
+                    print(f"Error Row {idx}: Future error: {e}")
+
+        self._save_progress(output_df, indices_to_process, output_path, output_column_name)
+
+    def _verdict_template_hash(self, constrained: bool) -> str:
+        return self.constrained_template_hash if constrained else self.template_hash
+
+    def _verdict_key(self, input_df: pd.DataFrame, idx: int, constrained: bool = False) -> str:
+        return self.verdict_store.make_key(
+            self.model_name,
+            self._verdict_template_hash(constrained),
+            input_df.loc[idx, self.question_column],
+            input_df.loc[idx, self.correct_answer_column],
+            input_df.loc[idx, self.output_column],
+        )
+
+    def _recall_verdicts(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices: list[int], output_column_name: str, constrained: bool = False) -> list[int]:
+        keys = {idx: self._verdict_key(input_df, idx, constrained) for idx in indices}
+        found = self.verdict_store.get_many(list(set(keys.values())))
+
+        remaining = []
+        for idx in indices:
+            if keys[idx] in found:
+                verdict, confidence = found[keys[idx]]
+                output_df.loc[idx, output_column_name] = verdict
+                output_df.loc[idx, "judge_source"] = "memo"
+                if constrained:
+                    output_df.loc[idx, f"{output_column_name}_confidence"] = confidence
+            else:
+                remaining.append(idx)
+
+        print(f"Verdict store answered {len(indices) - len(remaining)}/{len(indices)} rows")
+        return remaining
+
+    def _remember_verdicts(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices: list[int], output_column_name: str, constrained: bool = False) -> None:
+        if self.verdict_store is None:
+            return
+
+        confidence_column = f"{output_column_name}_confidence"
+        entries = []
+        for idx in indices:
+            verdict = output_df.loc[idx, output_column_name]
+            if pd.isna(verdict) or 'ERROR' in str(verdict):
+                continue
+            # Kept with the verdict so recalled rows are not escalated by JudgeEnsemble for lack of a confidence
+            confidence = output_df.loc[idx, confidence_column] if constrained and confidence_column in output_df.columns else None
+            confidence = None if confidence is None or pd.isna(confidence) else float(confidence)
+            entries.append((self._verdict_key(input_df, idx, constrained), self.model_name, self._verdict_template_hash(constrained), str(verdict), confidence))
+        self.verdict_store.put_many(entries)
+
+    def _apply_prejudge(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices: list[int], output_column_name: str, pass_threshold: float, fail_threshold: float | None) -> list[int]:
+        remaining = []
+        for idx in indices:
+            verdict = prejudge(input_df.loc[idx, self.output_column], input_df.loc[idx, self.correct_answer_column], pass_threshold, fail_threshold)
+            if verdict is None:
+                output_df.loc[idx, "judge_source"] = "llm"
+                remaining.append(idx)
+            else:
+                output_df.loc[idx, output_column_name] = "true" if verdict else "false"
+                output_df.loc[idx, "judge_source"] = "lexical"
+
+        decided = len(indices) - len(remaining)
+        print(f"Lexical pre-judge decided {decided}/{len(indices)} rows, {len(remaining)} sent to the LLM judge")
+        return remaining
+
+    def _apply_distractor_prematch(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices: list[int], output_column_name: str) -> list[int]:
+        remaining = []
+        for idx in indices:
+            label = match_distractor(input_df.loc[idx, self.output_column], self.distractor_phrases)
+            if label is None:
+                output_df.loc[idx, "judge_source"] = "llm"
+                remaining.append(idx)
+            else:
+                output_df.loc[idx, output_column_name] = str(label)
+                output_df.loc[idx, "judge_source"] = "lexical"
+
+        decided = len(indices) - len(remaining)
+        print(f"Lexical distractor match labeled {decided}/{len(indices)} rows, {len(remaining)} sent to the LLM judge")
+        return remaining
+
+    def evaluate(self, input_path: str, output_path: str, max_context_length: int, max_tokens_per_minute: int, output_column_name: str = "llm_judge_output", trace_path: str = None, prejudge_thresholds: tuple[float, float | None] = None, judge_batch_size: int = 1, constrained: bool = False) -> None:
+        if constrained and judge_batch_size > 1:
+            raise ValueError("Constrained verdicts are single-item requests; use judge_batch_size=1")
+
         input_df = pd.read_csv(input_path)
         input_df['token_count'] = [100] * len(input_df)
         
@@ -114,11 +433,11 @@ class LLMJudge:
                 output_df[output_column_name] = None
         else:
             output_df = input_df.copy()
-            output_df['llm_judge_output'] = None
+            output_df[output_column_name] = None
 
         need_processing = (
-            output_df['llm_judge_output'].isna() | 
-            output_df['llm_judge_output'].astype(str).str.contains('ERROR', na=False)
+            output_df[output_column_name].isna() | 
+            output_df[output_column_name].astype(str).str.contains('ERROR', na=False)
         )
         to_process = output_df[need_processing].index.tolist()
         
@@ -127,18 +446,148 @@ class LLMJudge:
         else:
             print("All rows already processed successfully")
             return
+
+        if self.verdict_store is not None:
+            to_process = self._recall_verdicts(input_df, output_df, to_process, output_column_name, constrained)
+
+        if prejudge_thresholds is not None:
+            to_process = self._apply_prejudge(input_df, output_df, to_process, output_column_name, *prejudge_thresholds)
+
+        if self.verdict_store is not None or prejudge_thresholds is not None:
+            output_df.to_csv(output_path, index=False)
+            if not to_process:
+                return
             
         input_to_process = input_df.loc[to_process]
         batches = self.provider.create_batches(input_to_process, max_tokens_per_minute)
         print(f"Created {len(batches)} batches based on {max_tokens_per_minute:,} tokens/minute")
         
-        for i, batch_indices in enumerate(batches):
-            self._process_for_evaluation(input_to_process, output_df, batch_indices, output_path)
-            if i < len(batches) - 1:
-                print("Waiting 60 seconds")
-                time.sleep(60)
+        elapsed = self.provider.run_batches(
+            input_to_process,
+            batches,
+            lambda batch_indices: self._process_for_evaluation(input_to_process, output_df, batch_indices, output_path, output_column_name, constrained=constrained)
+            if judge_batch_size <= 1
+            else self._process_batched_evaluation(input_to_process, output_df, batch_indices, output_path, judge_batch_size, output_column_name),
+        )
+
+        report_usage(output_df, to_process, output_column_name, self.model_name, elapsed, output_path, self.provider.billed)
+        if trace_path:
+            export_trace(self.provider.tracer, trace_path)
+
+    def evaluate_many(self, jobs: list[tuple[str, str]], max_tokens_per_minute: int, output_column_name: str = "llm_judge_output", trace_path: str = None, prejudge_thresholds: tuple[float, float | None] = None, constrained: bool = False) -> list[pd.DataFrame]:
+        # Pending rows of every (input_path, output_path) job share one batch schedule, so the window sleeps are paid once
+        input_dfs, output_dfs, pending = [], [], []
+        for job, (input_path, output_path) in enumerate(jobs):
+            input_df = pd.read_csv(input_path)
+            input_df['token_count'] = [100] * len(input_df)
+
+            if os.path.exists(output_path):
+                output_df = pd.read_csv(output_path)
+                if output_column_name not in output_df.columns:
+                    output_df[output_column_name] = None
+            else:
+                output_df = input_df.copy()
+                output_df[output_column_name] = None
+
+            need_processing = (
+                output_df[output_column_name].isna() |
+                output_df[output_column_name].astype(str).str.contains('ERROR', na=False)
+            )
+            to_process = output_df[need_processing].index.tolist()
+
+            if to_process and self.verdict_store is not None:
+                to_process = self._recall_verdicts(input_df, output_df, to_process, output_column_name, constrained)
+            if to_process and prejudge_thresholds is not None:
+                to_process = self._apply_prejudge(input_df, output_df, to_process, output_column_name, *prejudge_thresholds)
+            output_df.to_csv(output_path, index=False)
+
+            print(f"{input_path}: {len(to_process)}/{len(output_df)} rows to judge")
+            input_dfs.append(input_df)
+            output_dfs.append(output_df)
+            pending.extend((job, idx) for idx in to_process)
+
+        if not pending:
+            print("All rows already processed successfully")
+            return output_dfs
+
+        pool_df = pd.DataFrame(
+            {"token_count": [100] * len(pending)},
+            index=pd.MultiIndex.from_tuples(pending, names=["job", "row"]),
+        )
+        batches = self.provider.create_batches(pool_df, max_tokens_per_minute)
+        print(f"Created {len(batches)} batches for {len(pending)} rows from {len(jobs)} files based on {max_tokens_per_minute:,} tokens/minute")
+
+        def process_pooled_batch(batch: list[tuple[int, int]]) -> None:
+            rows_by_job = {}
+            for job, idx in batch:
+                rows_by_job.setdefault(job, []).append(idx)
+
+            # Each file's share of the batch runs concurrently and is saved to its own output
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(rows_by_job)) as executor:
+                futures = [
+                    executor.submit(self._process_for_evaluation, input_dfs[job], output_dfs[job], indices, jobs[job][1], output_column_name, constrained)
+                    for job, indices in rows_by_job.items()
+                ]
+                for future in futures:
+                    future.result()
+
+        elapsed = self.provider.run_batches(pool_df, batches, process_pooled_batch)
+
+        for job, (_, output_path) in enumerate(jobs):
+            judged = [idx for pending_job, idx in pending if pending_job == job]
+            if judged:
+                report_usage(output_dfs[job], judged, output_column_name, self.model_name, elapsed, output_path, self.provider.billed)
+        if trace_path:
+            export_trace(self.provider.tracer, trace_path)
+        return output_dfs
+
+    def evaluate_fused(self, input_path: str, output_path: str, max_tokens_per_minute: int, output_column_name: str = "llm_judge_output", distractor_column_name: str = "distractor_label", trace_path: str = None) -> pd.DataFrame:
+        # Correctness and the distractor pick in one request per row, instead of evaluate followed by analyze_distractors
+        if not self.distractor_phrases:
+            raise ValueError("Fused judging needs a distractors_file")
 
-    def analyze_distractors(self, input_path: str, output_path: str, max_context_length: int, max_tokens_per_minute: int, output_column_name: str = "distractor_label") -> pd.DataFrame:
+        input_df = pd.read_csv(input_path)
+        input_df['token_count'] = [100] * len(input_df)
+
+        if os.path.exists(output_path):
+            print(f"Loading existing progress from {output_path}")
+            output_df = pd.read_csv(output_path)
+        else:
+            output_df = input_df.copy()
+
+        for column in [output_column_name, distractor_column_name]:
+            if column not in output_df.columns:
+                output_df[column] = None
+        output_df[distractor_column_name] = output_df[distractor_column_name].astype(object)
+
+        need_processing = (
+            output_df[output_column_name].isna() |
+            output_df[output_column_name].astype(str).str.contains('ERROR', na=False)
+        )
+        to_process = output_df[need_processing].index.tolist()
+
+        if to_process:
+            print(f"{len(to_process)} rows needing processing: {to_process[0]} to {to_process[-1]}")
+        else:
+            print("All rows already processed successfully")
+            return output_df
+
+        input_to_process = input_df.loc[to_process]
+        batches = self.provider.create_batches(input_to_process, max_tokens_per_minute)
+        print(f"Created {len(batches)} batches based on {max_tokens_per_minute:,} tokens/minute")
+
+        elapsed = self.provider.run_batches(
+            input_to_process,
+            batches,
+            lambda batch_indices: self._process_fused_evaluation(input_to_process, output_df, batch_indices, output_path, output_column_name, distractor_column_name),
+        )
+
+        report_usage(output_df, to_process, output_column_name, self.model_name, elapsed, output_path, self.provider.billed)
+        if trace_path:
+            export_trace(self.provider.tracer, trace_path)
+        return output_df
+
+    def analyze_distractors(self, input_path: str, output_path: str, max_context_length: int, max_tokens_per_minute: int, output_column_name: str = "distractor_label", trace_path: str = None, prematch: bool = False) -> pd.DataFrame:
         input_df = pd.read_csv(input_path)
 
         input_df_filtered = input_df[input_df['token_count'] <= max_context_length].copy()
@@ -165,13 +614,266 @@ class LLMJudge:
         else:
             print("All rows already processed successfully")
             return output_df
+
+        if self.verdict_store is not None:
+            to_process = self._recall_verdicts(input_df_filtered, output_df, to_process, output_column_name)
+
+        if prematch:
+            to_process = self._apply_distractor_prematch(input_df_filtered, output_df, to_process, output_column_name)
+
+        if self.verdict_store is not None or prematch:
+            output_df.to_csv(output_path, index=False)
+            if not to_process:
+                return output_df
             
         input_to_process = input_df_filtered.loc[to_process]
         batches = self.provider.create_batches(input_to_process, max_tokens_per_minute)
         print(f"Created {len(batches)} batches based on {max_tokens_per_minute:,} tokens/minute")
         
-        for i, batch_indices in enumerate(batches):
-            self._process_for_evaluation(input_to_process, output_df, batch_indices, output_path, output_column_name)
-            if i < len(batches) - 1:
-                print("Waiting 60 seconds")
-                time.sleep(60)
\ No newline at end of file
+        elapsed = self.provider.run_batches(
+            input_to_process,
+            batches,
+            lambda batch_indices: self._process_for_evaluation(input_to_process, output_df, batch_indices, output_path, output_column_name),
+        )
+
+        report_usage(output_df, to_process, output_column_name, self.model_name, elapsed, output_path, self.provider.billed)
+        if trace_path:
+            export_trace(self.provider.tracer, trace_path)
+        return output_df
+
+
+# Cheap-first judge ensemble: every row gets the first judge's constrained verdict, later judges only see
+# low-confidence rows, a random audit sample and rows on which the judges consulted so far disagree
+class JudgeEnsemble:
+    def __init__(self, judges: list[LLMJudge], confidence_threshold: float = 0.9, audit_rate: float = 0.05, seed: int = 0):
+        self.judges = judges
+        self.confidence_threshold = confidence_threshold
+        self.audit_rate = audit_rate
+        self.seed = seed
+
+    def _verdict_column(self, stage: int) -> str:
+        return f"judge_{stage}_verdict"
+
+    def _verdicts(self, output_df: pd.DataFrame, stage: int) -> pd.Series:
+        column = self._verdict_column(stage)
+        if column not in output_df.columns:
+            return pd.Series(None, index=output_df.index, dtype=object)
+        return output_df[column].map(judge_to_bool)
+
+    def _is_confident(self, output_df: pd.DataFrame, stage: int) -> pd.Series:
+        # Rows without a confidence (providers without logprobs, verdicts stored before confidences were kept) count as low confidence
+        column = f"{self._verdict_column(stage)}_confidence"
+        if column not in output_df.columns:
+            return pd.Series(False, index=output_df.index)
+        return output_df[column].fillna(0) >= self.confidence_threshold
+
+    def _rows_for_stage(self, output_df: pd.DataFrame, stage: int) -> pd.Series:
+        if stage == 0:
+            return pd.Series(True, index=output_df.index)
+
+        previous = pd.concat([self._verdicts(output_df, k) for k in range(stage)], axis=1)
+        consulted = previous.notna()
+        if stage == 1:
+            return consulted.iloc[:, 0] & (~self._is_confident(output_df, 0) | output_df["audited"])
+
+        # Past the second judge, only rows that are still contested go further
+        disagree = previous.where(consulted).nunique(axis=1) > 1
+        return consulted.iloc[:, stage - 1] & (disagree | ~self._is_confident(output_df, stage - 1))
+
+    def _combine(self, output_df: pd.DataFrame, output_column_name: str) -> None:
+        verdicts = pd.concat([self._verdicts(output_df, k) for k in range(len(self.judges))], axis=1)
+        for idx, row in verdicts.iterrows():
+            votes = [bool(v) for v in row if v is not None and pd.notna(v)]
+            if not votes:
+                output_df.loc[idx, output_column_name] = "ERROR_NO_VERDICT"
+                output_df.loc[idx, "judges_consulted"] = 0
+                continue
+
+            true_votes = sum(votes)
+            if true_votes * 2 == len(votes):
+                # Judges are ordered cheap to strong, so a tie goes to the last judge consulted
+                verdict = votes[-1]
+            else:
+                verdict = true_votes * 2 > len(votes)
+            output_df.loc[idx, output_column_name] = "true" if verdict else "false"
+            output_df.loc[idx, "judges_consulted"] = len(votes)
+            output_df.loc[idx, "judge_agreement"] = sum(vote == verdict for vote in votes) / len(votes)
+
+    def evaluate(self, input_path: str, output_path: str, max_context_length: int, max_tokens_per_minute: int, output_column_name: str = "llm_judge_output", trace_path: str = None) -> pd.DataFrame:
+        input_df = pd.read_csv(input_path)
+        input_df['token_count'] = [100] * len(input_df)
+
+        if os.path.exists(output_path):
+            print(f"Loading existing progress from {output_path}")
+            output_df = pd.read_csv(output_path)
+        else:
+            output_df = input_df.copy()
+
+        # The audit sample is drawn once per file, so a resumed run audits the same rows
+        rng = np.random.default_rng(self.seed)
+        output_df["audited"] = rng.random(len(output_df)) < self.audit_rate
+
+        for stage, judge in enumerate(self.judges):
+            column = self._verdict_column(stage)
+            if column not in output_df.columns:
+                output_df[column] = None
+
+            in_scope = self._rows_for_stage(output_df, stage)
+            missing = output_df[column].isna() | output_df[column].astype(str).str.contains('ERROR', na=False)
+            to_process = output_df[in_scope & missing].index.tolist()
+            print(f"Judge {stage} ({judge.model_name}): {int(in_scope.sum())}/{len(output_df)} rows in scope, {len(to_process)} to judge")
+
+            if to_process and judge.verdict_store is not None:
+                to_process = judge._recall_verdicts(input_df, output_df, to_process, column, constrained=True)
+            if not to_process:
+                continue
+
+            input_to_process = input_df.loc[to_process]
+            batches = judge.provider.create_batches(input_to_process, max_tokens_per_minute)
+            elapsed = judge.provider.run_batches(
+                input_to_process,
+                batches,
+                lambda batch_indices: judge._process_for_evaluation(input_to_process, output_df, batch_indices, output_path, column, constrained=True),
+            )
+            report_usage(output_df, to_process, column, judge.model_name, elapsed, f"{os.path.splitext(output_path)[0]}_judge_{stage}.csv", judge.provider.billed)
+            if trace_path:
+                export_trace(judge.provider.tracer, f"{os.path.splitext(trace_path)[0]}_judge_{stage}.json")
+
+        self._combine(output_df, output_column_name)
+        output_df.to_csv(output_path, index=False)
+
+        first, audit = self._verdicts(output_df, 0), output_df["audited"]
+        if len(self.judges) > 1:
+            second = self._verdicts(output_df, 1)
+            audited = audit & self._is_confident(output_df, 0) & second.notna()
+            if audited.any():
+                disagreements = (first[audited] != second[audited]).sum()
+                print(f"Audit: judge 1 disagreed with a confident judge 0 on {disagreements}/{int(audited.sum())} sampled rows")
+
+        verdicts = int(output_df["judges_consulted"].sum())
+        print(f"Ensemble used {verdicts} verdicts for {len(output_df)} rows ({verdicts / max(len(output_df), 1):.2f} per row, vs {len(self.judges)} for a full ensemble)")
+        print(f"Mean per-row agreement: {output_df['judge_agreement'].mean():.3f}")
+        return output_df
+
+
+# Judges generation results while they are produced: the provider hands each finished row to submit(),
+# and a background thread judges queued rows under the judge's own tokens-per-minute budget
+class PipelinedJudge:
+    def __init__(self, judge: LLMJudge, results_path: str, output_path: str, max_tokens_per_minute: int, output_column_name: str = "llm_judge_output"):
+        self.judge = judge
+        self.results_path = results_path
+        self.output_path = output_path
+        self.output_column_name = output_column_name
+        # Same per-row token estimate as LLMJudge.evaluate
+        self.rows_per_window = max(1, max_tokens_per_minute // 100)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.initialized = False
+        self.judge_df = None
+        self.judged_indices = []
+        self.error = None
+        self.start_time = None
+
+    def start(self) -> None:
+        self.start_time = time.time()
+        # Rows generated by an earlier, interrupted run are judged too
+        if os.path.exists(self.results_path):
+            self.queue.put(("init", pd.read_csv(self.results_path)))
+            self.initialized = True
+        self.thread.start()
+
+    def submit(self, idx: int, results_df: pd.DataFrame) -> None:
+        # Called from the generation loop; the judge thread owns judge_df, so only copies cross over
+        if not self.initialized:
+            self.queue.put(("init", results_df.copy()))
+            self.initialized = True
+        self.queue.put(("row", idx, results_df.loc[idx].copy()))
+
+    def close(self) -> None:
+        self.queue.put(("close",))
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+        if self.judged_indices:
+            report_usage(self.judge_df, self.judged_indices, self.output_column_name, self.judge.model_name, time.time() - self.start_time, self.output_path, self.judge.provider.billed)
+
+    def _is_judgeable(self, idx: int) -> bool:
+        output = self.judge_df.loc[idx, self.judge.output_column]
+        verdict = self.judge_df.loc[idx, self.output_column_name]
+        needs_verdict = pd.isna(verdict) or 'ERROR' in str(verdict)
+        return pd.notna(output) and not str(output).startswith('ERROR') and needs_verdict
+
+    def _initialize(self, results_df: pd.DataFrame) -> list[int]:
+        self.judge_df = results_df.copy()
+        self.judge_df[self.output_column_name] = None
+
+        # Keep verdicts from an earlier run for rows whose generated output has not changed since
+        if os.path.exists(self.output_path):
+            previous_df = pd.read_csv(self.output_path)
+            if len(previous_df) == len(self.judge_df) and self.output_column_name in previous_df.columns:
+                previous_df.index = self.judge_df.index
+                unchanged = previous_df[self.judge.output_column].astype(str) == self.judge_df[self.judge.output_column].astype(str)
+                self.judge_df.loc[unchanged, self.output_column_name] = previous_df.loc[unchanged, self.output_column_name]
+
+        return [idx for idx in self.judge_df.index if self._is_judgeable(idx)]
+
+    def _handle(self, message: tuple, pending: list[int]) -> bool:
+        if message[0] == "init":
+            pending.extend(self._initialize(message[1]))
+        elif message[0] == "row":
+            _, idx, row = message
+            for column, value in row.items():
+                if column in self.judge_df.columns:
+                    self.judge_df.loc[idx, column] = value
+            self.judge_df.loc[idx, self.output_column_name] = None
+            if self._is_judgeable(idx) and idx not in pending:
+                pending.append(idx)
+        return message[0] == "close"
+
+    def _run(self) -> None:
+        try:
+            self._judge_queued_rows()
+        except Exception as e:
+            self.error = e
+
+    def _judge_queued_rows(self) -> None:
+        pending = []
+        closed = False
+        window_start, window_rows = time.time(), 0
+
+        while True:
+            # Block only while there is nothing left to judge
+            block = not pending and not closed
+            try:
+                while True:
+                    message = self.queue.get(block=block)
+                    block = False
+                    closed = self._handle(message, pending) or closed
+            except queue.Empty:
+                pass
+
+            if not pending:
+                if closed:
+                    break
+                continue
+
+            if window_rows >= self.rows_per_window:
+                wait_seconds = window_start + self.judge.provider.rate_limit_window - time.time()
+                if wait_seconds > 0:
+                    print(f"Judge waiting {wait_seconds:.0f} seconds")
+                    with self.judge.provider.tracer.span("rate_limit_wait", "rate_limit"):
+                        time.sleep(wait_seconds)
+                window_start, window_rows = time.time(), 0
+
+            batch = pending[:self.rows_per_window - window_rows]
+            del pending[:len(batch)]
+            window_rows += len(batch)
+
+            if self.judge.verdict_store is not None:
+                batch = self.judge._recall_verdicts(self.judge_df, self.judge_df, batch, self.output_column_name)
+                self.judge_df.to_csv(self.output_path, index=False)
+            if batch:
+                with self.judge.provider.tracer.span("batch", "batch", rows=len(batch)):
+                    self.judge._process_for_evaluation(self.judge_df, self.judge_df, batch, self.output_path, self.output_column_name)
+                self.judged_indices.extend(batch)
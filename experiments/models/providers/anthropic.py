@@ -1,6 +1,6 @@
 import os
 from anthropic import Anthropic
-from typing import Any
+from typing import Any, Callable
 from ..base_provider import BaseProvider
 
 class AnthropicProvider(BaseProvider):
@@ -20,10 +20,52 @@ class AnthropicProvider(BaseProvider):
             }
         )
 
+        self.record_response_usage(response)
+
         if response.content and len(response.content) > 0:
             return index, response.content[0].text
         else:
             return index, "ERROR_NO_CONTENT"
 
+    def process_streaming_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, guard: Callable[[str], str | None]) -> tuple[int, str, str | None]:
+        parts = []
+        truncation_reason = None
+        with self.client.messages.stream(
+            model=model_name,
+            temperature=0,
+            max_tokens=max_output_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            thinking = {
+                "type": "disabled",
+            }
+        ) as stream:
+            for text in stream.text_stream:
+                parts.append(text)
+                truncation_reason = guard(text)
+                if truncation_reason is not None:
+                    break
+
+            # The snapshot holds the usage reported so far, also when the stream was cut short
+            self.record_response_usage(stream.current_message_snapshot)
+
+        if not parts:
+            return index, "ERROR_NO_CONTENT", None
+        return index, "".join(parts), truncation_reason
+
+    def record_response_usage(self, response: Any) -> None:
+        if response.usage:
+            cache_read_tokens = response.usage.cache_read_input_tokens or 0
+            cache_creation_tokens = response.usage.cache_creation_input_tokens or 0
+            self.record_usage(
+                prompt_tokens=response.usage.input_tokens + cache_read_tokens + cache_creation_tokens,
+                cached_tokens=cache_read_tokens,
+                completion_tokens=response.usage.output_tokens,
+            )
+
     def get_client(self) -> Any:
         return Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
\ No newline at end of file
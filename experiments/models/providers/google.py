@@ -3,11 +3,14 @@ from google.cloud.aiplatform_v1.types import (
     GenerateContentRequest,
     GenerationConfig,
     Content,
-    Part
+    Part,
+    Schema,
+    Type
 )
 import os
-from typing import Any
+from typing import Any, Callable
 from ..base_provider import BaseProvider
+from ..verdicts import VERDICT_MAX_OUTPUT_TOKENS, VERDICT_TOP_LOGPROBS, parse_verdict, find_verdict_token, verdict_confidence
 
 class GoogleProvider(BaseProvider):
     def __init__(self, model_name: str):
@@ -36,6 +39,8 @@ class GoogleProvider(BaseProvider):
         )
         
         response = self.client.generate_content(request=request)
+
+        self.record_response_usage(response)
         
         if response.candidates and len(response.candidates) > 0:
             if response.candidates[0].content.parts[0].text == "":
@@ -45,6 +50,100 @@ class GoogleProvider(BaseProvider):
             return index, "ERROR_NO_CONTENT"
             
 
+    def process_streaming_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, guard: Callable[[str], str | None]) -> tuple[int, str, str | None]:
+        gen_config = GenerationConfig(
+            temperature=0,
+            thinking_config=GenerationConfig.ThinkingConfig(
+                thinking_budget=0
+            ),
+            max_output_tokens=max_output_tokens
+        )
+
+        request = GenerateContentRequest(
+            model=self.model_path,
+            contents=[
+                Content(
+                    role="user",
+                    parts=[Part(text=prompt)]
+                )
+            ],
+            generation_config=gen_config
+        )
+
+        responses = self.client.stream_generate_content(request=request)
+
+        # Each chunk reports the usage so far, so a cancelled request keeps the count up to the last chunk received
+        parts = []
+        truncation_reason = None
+        for response in responses:
+            self.record_response_usage(response)
+            if response.candidates and response.candidates[0].content.parts:
+                text = response.candidates[0].content.parts[0].text
+                parts.append(text)
+                truncation_reason = guard(text)
+                if truncation_reason is not None:
+                    responses.cancel()
+                    break
+
+        if not parts:
+            return index, "ERROR_NO_CONTENT", None
+        return index, "".join(parts), truncation_reason
+
+    def process_verdict_prompt(self, prompt: str, model_name: str, index: int) -> tuple[int, str, float | None]:
+        gen_config = GenerationConfig(
+            temperature=0,
+            thinking_config=GenerationConfig.ThinkingConfig(
+                thinking_budget=0
+            ),
+            max_output_tokens=VERDICT_MAX_OUTPUT_TOKENS,
+            response_mime_type="application/json",
+            response_schema=Schema(
+                type_=Type.OBJECT,
+                properties={"verdict": Schema(type_=Type.BOOLEAN)},
+                required=["verdict"],
+            ),
+            response_logprobs=True,
+            logprobs=VERDICT_TOP_LOGPROBS,
+        )
+
+        request = GenerateContentRequest(
+            model=self.model_path,
+            contents=[
+                Content(
+                    role="user",
+                    parts=[Part(text=prompt)]
+                )
+            ],
+            generation_config=gen_config
+        )
+
+        response = self.client.generate_content(request=request)
+
+        self.record_response_usage(response)
+
+        if not response.candidates or not response.candidates[0].content.parts:
+            return index, "ERROR_NO_CONTENT", None
+
+        candidate = response.candidates[0]
+        verdict = parse_verdict(candidate.content.parts[0].text)
+
+        confidence = None
+        logprobs = candidate.logprobs_result
+        position = find_verdict_token([chosen.token for chosen in logprobs.chosen_candidates])
+        if position is not None and position < len(logprobs.top_candidates):
+            top_logprobs = [(alternative.token, alternative.log_probability) for alternative in logprobs.top_candidates[position].candidates]
+            confidence = verdict_confidence(verdict, top_logprobs)
+
+        return index, verdict, confidence
+
+    def record_response_usage(self, response: Any) -> None:
+        if response.usage_metadata:
+            self.record_usage(
+                prompt_tokens=response.usage_metadata.prompt_token_count,
+                cached_tokens=response.usage_metadata.cached_content_token_count,
+                completion_tokens=response.usage_metadata.candidates_token_count,
+            )
+
     def get_client(self) -> Any:
         return aiplatform_v1.PredictionServiceClient()
         # this requires GOOGLE_APPLICATION_CREDENTIALS in your environment: export GOOGLE_APPLICATION_CREDENTIALS="path/to/your/service-account-key.json"
@@ -1,10 +1,86 @@
 import os
+import hashlib
+import threading
+import pandas as pd
 from ollama import Client
-from typing import Any
+from typing import Any, Callable
 from ..base_provider import BaseProvider
+from ..verdicts import VERDICT_MAX_OUTPUT_TOKENS, VERDICT_TOP_LOGPROBS, VERDICT_SCHEMA, parse_verdict, find_verdict_token, verdict_confidence
 
 class OllamaProvider(BaseProvider):
+    billed = False
+
+    # num_ctx is rounded up to a power of two so that rows of similar length share one KV-cache allocation
+    MIN_NUM_CTX = 2048
+
+    def __init__(self):
+        super().__init__()
+        # Keep the model resident across the 60 s batch sleeps; each request refreshes the timer
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Keyed by prompt hash: row indices repeat across the files of main_many and between generation and judging
+        self.token_counts = {}
+        self.num_ctx_high_water = 0
+        self.warmed_up_models = set()
+        self.lock = threading.Lock()
+        self.warmup_lock = threading.Lock()
+
+    def bucket_num_ctx(self, required_tokens: int) -> int:
+        num_ctx = self.MIN_NUM_CTX
+        while num_ctx < required_tokens:
+            num_ctx *= 2
+        return num_ctx
+
+    def prompt_key(self, prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get_num_ctx(self, prompt: str, max_output_tokens: int) -> int:
+        # Rows without a token_count (e.g. judge prompts) fall back to a conservative ~3 chars/token estimate
+        prompt_tokens = self.token_counts.get(self.prompt_key(prompt))
+        if prompt_tokens is None:
+            prompt_tokens = len(prompt) // 3
+        num_ctx = self.bucket_num_ctx(prompt_tokens + max_output_tokens)
+
+        # Never shrink below a context size that is already allocated, otherwise Ollama reloads the model
+        with self.lock:
+            self.num_ctx_high_water = max(self.num_ctx_high_water, num_ctx)
+            return self.num_ctx_high_water
+
+    def warmup(self, model_name: str, num_ctx: int) -> None:
+        print(f"Loading {model_name} with num_ctx={num_ctx:,} (keep_alive={self.keep_alive})")
+        try:
+            # An empty prompt only loads the model; the one-token generation warms it before the first timed request
+            self.client.generate(model=model_name, prompt="", options={"num_ctx": num_ctx}, keep_alive=self.keep_alive)
+            self.client.generate(model=model_name, prompt="Hello", options={"num_ctx": num_ctx, "num_predict": 1}, keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"WARNING: Warmup failed for {model_name}: {e}")
+        self.warmed_up_models.add(model_name)
+
+    def ensure_warm(self, model_name: str, num_ctx: int) -> None:
+        # Every request path calls this, so judge prompts that never go through process_batch are warmed too; the
+        # first request loads the model and concurrent ones wait for it
+        if model_name in self.warmed_up_models:
+            return
+        with self.warmup_lock:
+            if model_name not in self.warmed_up_models:
+                self.warmup(model_name, num_ctx)
+
+    def process_batch(self, input_df: pd.DataFrame, output_df: pd.DataFrame, indices_to_process: list[int], model_name: str, output_path: str, input_column: str, output_column: str, on_result: Callable[[int, pd.DataFrame], None] = None, stream_guard: Callable[[pd.Series], Callable[[str], str | None]] = None) -> None:
+        prompts = input_df.loc[indices_to_process, input_column].astype(str)
+        if 'token_count' in input_df.columns:
+            token_counts = input_df.loc[indices_to_process, 'token_count'].astype(int)
+            with self.lock:
+                self.token_counts.update(zip(map(self.prompt_key, prompts), token_counts))
+
+        if model_name not in self.warmed_up_models:
+            # The whole batch's largest context is loaded up front, so its concurrent requests don't trigger a reload
+            max_output_tokens = int(input_df.loc[indices_to_process, 'max_output_tokens'].max()) if 'max_output_tokens' in input_df.columns else 1000
+            self.ensure_warm(model_name, max(self.get_num_ctx(prompt, max_output_tokens) for prompt in prompts))
+
+        super().process_batch(input_df, output_df, indices_to_process, model_name, output_path, input_column, output_column, on_result, stream_guard)
+
     def process_single_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int) -> tuple[int, str]:
+        num_ctx = self.get_num_ctx(prompt, max_output_tokens)
+        self.ensure_warm(model_name, num_ctx)
         try:
             response = self.client.chat(
                 model=model_name,
@@ -17,9 +93,14 @@ class OllamaProvider(BaseProvider):
                 options={
                     "temperature": 0,
                     "num_predict": max_output_tokens,
-                }
+                    "num_ctx": num_ctx,
+                },
+                keep_alive=self.keep_alive,
             )
 
+            if response:
+                self.record_usage(**self.get_usage(response))
+
             if response and 'message' in response and 'content' in response['message']:
                 content = response['message']['content']
                 if content == "":
@@ -31,6 +112,106 @@ class OllamaProvider(BaseProvider):
         except Exception as e:
             return index, f"ERROR: {str(e)}"
 
+    def process_streaming_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, guard: Callable[[str], str | None]) -> tuple[int, str, str | None]:
+        num_ctx = self.get_num_ctx(prompt, max_output_tokens)
+        self.ensure_warm(model_name, num_ctx)
+        try:
+            stream = self.client.chat(
+                model=model_name,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                options={
+                    "temperature": 0,
+                    "num_predict": max_output_tokens,
+                    "num_ctx": num_ctx,
+                },
+                keep_alive=self.keep_alive,
+                stream=True,
+            )
+
+            # Token counts and durations come with the final chunk, so a cancelled request has none
+            parts = []
+            truncation_reason = None
+            for chunk in stream:
+                if chunk.get('done'):
+                    self.record_usage(**self.get_usage(chunk))
+                content = (chunk.get('message') or {}).get('content')
+                if content:
+                    parts.append(content)
+                    truncation_reason = guard(content)
+                    if truncation_reason is not None:
+                        # Closing the generator closes the HTTP stream, which stops generation on the server
+                        stream.close()
+                        break
+
+            if not parts:
+                return index, "ERROR_NO_CONTENT", None
+            return index, "".join(parts), truncation_reason
+        except Exception as e:
+            return index, f"ERROR: {str(e)}", None
+
+    def process_verdict_prompt(self, prompt: str, model_name: str, index: int) -> tuple[int, str, float | None]:
+        num_ctx = self.get_num_ctx(prompt, VERDICT_MAX_OUTPUT_TOKENS)
+        self.ensure_warm(model_name, num_ctx)
+        request = {
+            "model": model_name,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "format": VERDICT_SCHEMA,
+            "options": {
+                "temperature": 0,
+                "num_predict": VERDICT_MAX_OUTPUT_TOKENS,
+                "num_ctx": num_ctx,
+            },
+            "keep_alive": self.keep_alive,
+        }
+
+        try:
+            try:
+                response = self.client.chat(**request, logprobs=True, top_logprobs=VERDICT_TOP_LOGPROBS)
+            except TypeError:
+                # Older ollama clients do not accept logprobs; the verdict is still schema-constrained
+                response = self.client.chat(**request)
+
+            if response:
+                self.record_usage(**self.get_usage(response))
+
+            if not response or 'message' not in response or not response['message'].get('content'):
+                return index, "ERROR_NO_CONTENT", None
+
+            verdict = parse_verdict(response['message']['content'])
+
+            confidence = None
+            logprobs = response.get('logprobs') or []
+            position = find_verdict_token([token['token'] for token in logprobs])
+            if position is not None:
+                top_logprobs = [(candidate['token'], candidate['logprob']) for candidate in logprobs[position].get('top_logprobs') or []]
+                confidence = verdict_confidence(verdict, top_logprobs)
+
+            return index, verdict, confidence
+        except Exception as e:
+            return index, f"ERROR: {str(e)}", None
+
+    def get_usage(self, response: Any) -> dict:
+        # Ollama reports durations in nanoseconds; store seconds like the rest of the timing data
+        usage = {
+            "prompt_tokens": response.get('prompt_eval_count'),
+            "cached_tokens": 0,
+            "completion_tokens": response.get('eval_count'),
+        }
+        for field in ["load_duration", "prompt_eval_duration", "eval_duration", "total_duration"]:
+            if response.get(field) is not None:
+                usage[field] = response.get(field) / 1e9
+        return usage
+
     def get_client(self) -> Any:
         # Allow custom Ollama host via environment variable, default to localhost
         ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
@@ -1,7 +1,8 @@
 import os
 from openai import OpenAI
-from typing import Any
+from typing import Any, Callable
 from ..base_provider import BaseProvider
+from ..verdicts import VERDICT_MAX_OUTPUT_TOKENS, VERDICT_TOP_LOGPROBS, VERDICT_SCHEMA, parse_verdict, find_verdict_token, verdict_confidence
 
 class OpenAIProvider(BaseProvider):
     def process_single_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int) -> tuple[int, str]:
@@ -17,6 +18,8 @@ class OpenAIProvider(BaseProvider):
             ]
         )
 
+        self.record_response_usage(response)
+
         if response.choices and len(response.choices) > 0:
             if response.choices[0].message.content == "":
                 print(response)
@@ -24,5 +27,81 @@ class OpenAIProvider(BaseProvider):
         else:
             return index, "ERROR_NO_CONTENT"
 
+    def process_streaming_prompt(self, prompt: str, model_name: str, max_output_tokens: int, index: int, guard: Callable[[str], str | None]) -> tuple[int, str, str | None]:
+        stream = self.client.chat.completions.create(
+            model=model_name,
+            temperature=0,
+            max_completion_tokens=max_output_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        # Usage arrives in the last chunk, so a cancelled request has none
+        parts = []
+        truncation_reason = None
+        with stream:
+            for chunk in stream:
+                self.record_response_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    truncation_reason = guard(chunk.choices[0].delta.content)
+                    if truncation_reason is not None:
+                        break
+
+        if not parts:
+            return index, "ERROR_NO_CONTENT", None
+        return index, "".join(parts), truncation_reason
+
+    def process_verdict_prompt(self, prompt: str, model_name: str, index: int) -> tuple[int, str, float | None]:
+        response = self.client.chat.completions.create(
+            model=model_name,
+            temperature=0,
+            max_completion_tokens=VERDICT_MAX_OUTPUT_TOKENS,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "verdict", "strict": True, "schema": VERDICT_SCHEMA},
+            },
+            logprobs=True,
+            top_logprobs=VERDICT_TOP_LOGPROBS,
+        )
+
+        self.record_response_usage(response)
+
+        if not response.choices or not response.choices[0].message.content:
+            return index, "ERROR_NO_CONTENT", None
+
+        choice = response.choices[0]
+        verdict = parse_verdict(choice.message.content)
+
+        confidence = None
+        if choice.logprobs and choice.logprobs.content:
+            position = find_verdict_token([token.token for token in choice.logprobs.content])
+            if position is not None:
+                top_logprobs = [(candidate.token, candidate.logprob) for candidate in choice.logprobs.content[position].top_logprobs]
+                confidence = verdict_confidence(verdict, top_logprobs)
+
+        return index, verdict, confidence
+
+    def record_response_usage(self, response: Any) -> None:
+        if response.usage:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            self.record_usage(
+                prompt_tokens=response.usage.prompt_tokens,
+                cached_tokens=getattr(details, "cached_tokens", None) or 0,
+                completion_tokens=response.usage.completion_tokens,
+            )
+
     def get_client(self) -> Any:
         return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+# Latency histogram edges in seconds, roughly doubling from 100 ms to ~14 min
+LATENCY_BIN_EDGES = [0] + [0.1 * 2 ** i for i in range(14)] + [float("inf")]
+
+
+# Collects spans in memory and exports them in Chrome trace format (chrome://tracing, Perfetto)
+class Tracer:
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def add_span(self, name: str, category: str, start: float, end: float, **args) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), **args)
+
+    def export_chrome_trace(self, trace_path: str) -> None:
+        with self.lock:
+            events = list(self.events)
+        with open(trace_path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace with {len(events)} spans saved to: {trace_path}")
+
+    def get_spans(self, name: str) -> pd.DataFrame:
+        with self.lock:
+            rows = [{**event["args"], "duration": event["dur"] / 1e6} for event in self.events if event["name"] == name]
+        return pd.DataFrame(rows)
+
+    def time_by_category(self) -> pd.Series:
+        with self.lock:
+            durations = [(event["cat"], event["dur"] / 1e6) for event in self.events]
+        return pd.DataFrame(durations, columns=["category", "seconds"]).groupby("category")["seconds"].sum()
+
+
+def latency_histograms(request_spans: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for bucket_column in ["token_count", "approximate_input_length"]:
+        if bucket_column not in request_spans.columns or request_spans[bucket_column].isna().all():
+            continue
+
+        spans = request_spans.dropna(subset=[bucket_column])
+        if bucket_column == "token_count":
+            buckets = (2 ** np.ceil(np.log2(spans[bucket_column].clip(lower=1)))).astype(int)
+        else:
+            buckets = spans[bucket_column].astype(int)
+
+        for (provider, bucket), group in spans.groupby([spans["provider"], buckets]):
+            counts, _ = np.histogram(group["duration"], bins=LATENCY_BIN_EDGES)
+            row = {
+                "provider": provider,
+                "bucket_column": bucket_column,
+                "bucket": bucket,
+                "requests": len(group),
+                "mean_s": group["duration"].mean(),
+                "p50_s": group["duration"].quantile(0.5),
+                "p90_s": group["duration"].quantile(0.9),
+                "p99_s": group["duration"].quantile(0.99),
+                "max_s": group["duration"].max(),
+            }
+            for left, right, count in zip(LATENCY_BIN_EDGES[:-1], LATENCY_BIN_EDGES[1:], counts):
+                row[f"le_{right:g}s" if right != float("inf") else f"gt_{left:g}s"] = int(count)
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def export_trace(tracer: Tracer, trace_path: str) -> None:
+    tracer.export_chrome_trace(trace_path)
+
+    print("Wall-clock time by span category (summed over threads):")
+    print(tracer.time_by_category().round(2).to_string())
+
+    request_spans = tracer.get_spans("request")
+    if request_spans.empty:
+        return
+
+    histograms = latency_histograms(request_spans)
+    histogram_path = f"{os.path.splitext(trace_path)[0]}_latency_histogram.csv"
+    histograms.to_csv(histogram_path, index=False)
+    print(f"Latency histograms saved to: {histogram_path}")
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pandas as pd
+
+USAGE_FIELDS = [
+    "prompt_tokens",
+    "cached_tokens",
+    "completion_tokens",
+    "load_duration",
+    "prompt_eval_duration",
+    "eval_duration",
+    "total_duration",
+    "coalesced",
+]
+
+# Estimated USD per 1M tokens (input, cached input, output); keys are matched as model name prefixes
+MODEL_PRICING = {
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "o3": (2.00, 0.50, 8.00),
+    "claude-opus-4": (15.00, 1.50, 75.00),
+    "claude-sonnet-4": (3.00, 0.30, 15.00),
+    "claude-3-7-sonnet": (3.00, 0.30, 15.00),
+    "claude-3-5-haiku": (0.80, 0.08, 4.00),
+    "gemini-2.5-pro": (1.25, 0.31, 10.00),
+    "gemini-2.5-flash": (0.30, 0.075, 2.50),
+}
+
+
+def get_pricing(model_name: str) -> tuple[float, float, float] | None:
+    # Longest prefix wins so that e.g. "gpt-4.1-mini-..." is not priced as "gpt-4.1"
+    for prefix in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model_name.startswith(prefix):
+            return MODEL_PRICING[prefix]
+    return None
+
+
+def usage_column(output_column: str, field: str) -> str:
+    return f"{output_column}_{field}"
+
+
+def write_usage(output_df: pd.DataFrame, idx: int, output_column: str, usage: dict) -> None:
+    for field, value in usage.items():
+        if field in USAGE_FIELDS and value is not None:
+            output_df.loc[idx, usage_column(output_column, field)] = float(value)
+
+
+def estimate_cost(prompt_tokens: float, cached_tokens: float, completion_tokens: float, model_name: str, billed: bool = True) -> float:
+    if not billed:
+        return 0.0
+
+    pricing = get_pricing(model_name)
+    if pricing is None:
+        return np.nan
+
+    input_price, cached_price, output_price = pricing
+    uncached_tokens = prompt_tokens - cached_tokens
+    return (uncached_tokens * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def get_length_bucket(df: pd.DataFrame) -> pd.Series:
+    if 'approximate_input_length' in df.columns:
+        return df['approximate_input_length']
+    # Fall back to power-of-two buckets of the tiktoken count
+    token_counts = df['token_count'].clip(lower=1)
+    return (2 ** np.ceil(np.log2(token_counts))).astype(int)
+
+
+def summarize_usage(output_df: pd.DataFrame, indices: list[int], output_column: str, model_name: str, elapsed_seconds: float, billed: bool = True) -> pd.DataFrame:
+    df = output_df.loc[indices].copy()
+    for field in ["prompt_tokens", "cached_tokens", "completion_tokens", "coalesced"]:
+        column = usage_column(output_column, field)
+        df[field] = df[column].fillna(0) if column in df.columns else 0.0
+
+    if 'token_count' not in df.columns:
+        df['token_count'] = np.nan
+
+    df['length_bucket'] = get_length_bucket(df) if df['token_count'].notna().any() else "all"
+    minutes = max(elapsed_seconds, 1e-9) / 60
+
+    rows = []
+    for group_name, group in [("all", df)] + [(bucket, g) for bucket, g in df.groupby('length_bucket')]:
+        prompt_tokens = group['prompt_tokens'].sum()
+        cached_tokens = group['cached_tokens'].sum()
+        completion_tokens = group['completion_tokens'].sum()
+        tiktoken_tokens = group.loc[group['coalesced'] == 0, 'token_count'].sum()
+
+        rows.append({
+            "model": model_name,
+            "length_bucket": group_name,
+            "rows": len(group),
+            "coalesced_rows": int(group['coalesced'].sum()),
+            "prompt_tokens": int(prompt_tokens),
+            "cached_tokens": int(cached_tokens),
+            "completion_tokens": int(completion_tokens),
+            "estimated_cost_usd": estimate_cost(prompt_tokens, cached_tokens, completion_tokens, model_name, billed),
+            "effective_tpm": (prompt_tokens + completion_tokens) / minutes,
+            "tiktoken_tokens": tiktoken_tokens,
+            "billed_to_tiktoken_ratio": prompt_tokens / tiktoken_tokens if tiktoken_tokens else np.nan,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def report_usage(output_df: pd.DataFrame, indices: list[int], output_column: str, model_name: str, elapsed_seconds: float, output_path: str, billed: bool = True) -> pd.DataFrame:
+    summary = summarize_usage(output_df, indices, output_column, model_name, elapsed_seconds, billed)
+
+    summary_path = f"{os.path.splitext(output_path)[0]}_usage_summary.csv"
+    summary.to_csv(summary_path, index=False)
+
+    print(f"\nUsage summary for {model_name} ({elapsed_seconds / 60:.1f} min):")
+    print(summary.to_string(index=False))
+    print(f"Usage summary saved to: {summary_path}")
+
+    return summary
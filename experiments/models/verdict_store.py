@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+
+def normalize_field(value) -> str:
+    # Only whitespace and unicode forms are normalized; case and punctuation can change a verdict (e.g. typos)
+    return " ".join(unicodedata.normalize("NFKC", str(value)).split())
+
+
+def hash_template(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+# Persistent judge verdicts keyed by (judge model, prompt template hash, normalized question/answer/output); callers fold
+# everything else that shapes a verdict (distractors, the constrained verdict schema) into the template hash
+class VerdictStore:
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, judge_model TEXT, template_hash TEXT, verdict TEXT, created_at REAL, confidence REAL)"
+        )
+        # Stores created before confidences were kept get the column, with no confidence for their verdicts
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(verdicts)")]
+        if "confidence" not in columns:
+            self.connection.execute("ALTER TABLE verdicts ADD COLUMN confidence REAL")
+        self.connection.commit()
+
+    def make_key(self, judge_model: str, template_hash: str, question, correct_answer, output) -> str:
+        fields = [judge_model, template_hash, normalize_field(question), normalize_field(correct_answer), normalize_field(output)]
+        return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[str, float | None]]:
+        found = {}
+        with self.lock:
+            # SQLite limits the number of bound parameters, so look keys up in chunks
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(f"SELECT key, verdict, confidence FROM verdicts WHERE key IN ({placeholders})", chunk)
+                found.update({key: (verdict, confidence) for key, verdict, confidence in rows.fetchall()})
+        return found
+
+    def put_many(self, entries: list[tuple[str, str, str, str, float | None]]) -> None:
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, judge_model, template_hash, verdict, created_at, confidence) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, judge_model, template_hash, verdict, now, confidence) for key, judge_model, template_hash, verdict, confidence in entries],
+            )
+            self.connection.commit()
@@ -0,0 +1,49 @@
+import json
+import math
+from .lexical_judge import judge_to_bool
+
+# A constrained verdict is a single JSON boolean, so a few tokens are enough even with the object around it
+VERDICT_MAX_OUTPUT_TOKENS = 20
+VERDICT_TOP_LOGPROBS = 5
+
+# JSON schema for constrained verdicts (Ollama `format`, OpenAI structured outputs, Gemini response_schema)
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {"verdict": {"type": "boolean"}},
+    "required": ["verdict"],
+    "additionalProperties": False,
+}
+
+
+def parse_verdict(response: str) -> str:
+    # Accepts {"verdict": true} as well as a bare true/false answer from providers without structured outputs
+    try:
+        parsed = json.loads(response)
+        value = judge_to_bool(parsed.get("verdict") if isinstance(parsed, dict) else parsed)
+    except (json.JSONDecodeError, TypeError):
+        value = judge_to_bool(response)
+
+    if value is None:
+        return f"ERROR_UNPARSEABLE_VERDICT: {response}"
+    return "true" if value else "false"
+
+
+def find_verdict_token(tokens: list[str]) -> int | None:
+    for position, token in enumerate(tokens):
+        if judge_to_bool(token) is not None:
+            return position
+    return None
+
+
+def verdict_confidence(verdict: str, top_logprobs: list[tuple[str, float]]) -> float | None:
+    # Probability of the returned verdict renormalized over the true/false alternatives at the verdict token
+    probabilities = {"true": 0.0, "false": 0.0}
+    for token, logprob in top_logprobs:
+        value = judge_to_bool(token)
+        if value is not None:
+            probabilities["true" if value else "false"] += math.exp(logprob)
+
+    total = probabilities["true"] + probabilities["false"]
+    if verdict not in probabilities or total == 0:
+        return None
+    return probabilities[verdict] / total
@@ -84,6 +84,13 @@ def main():
                        help='Maximum tokens per minute for rate limiting (default: 2_000_000)')
     parser.add_argument('--distractors-file', type=str, default=None,
                        help='Path to JSON file containing distractors')
+    parser.add_argument('--verdict-store-path', type=str, default=None,
+                       help='Optional SQLite file of judge verdicts; rows judged before with the same judge model, prompt and (question, answer, output) are not sent again')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
+    parser.add_argument('--prematch', action='store_true',
+                       help='Label outputs that contain exactly one distractor phrase, or clearly none, locally and send only the rest to the LLM judge')
+
     args = parser.parse_args()
     
     try:
@@ -93,14 +100,17 @@ def main():
             output_column=args.output_column,
             question_column=args.question_column,
             correct_answer_column=args.correct_answer_column,
-            distractors_file=args.distractors_file
+            distractors_file=args.distractors_file,
+            verdict_store_path=args.verdict_store_path
         )
         
         judge.analyze_distractors(
             input_path=args.input_path,
             output_path=args.output_path,
             max_context_length=args.max_context_length,
-            max_tokens_per_minute=args.max_tokens_per_minute
+            max_tokens_per_minute=args.max_tokens_per_minute,
+            trace_path=args.trace_path,
+            prematch=args.prematch
         )
 
         create_histogram_for_file(args.output_path, args.visual_path, args.model_name)
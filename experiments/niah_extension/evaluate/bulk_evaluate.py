@@ -0,0 +1,161 @@
+import argparse
+import glob
+import sys
+import os
+import dotenv
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from models.llm_judge import LLMJudge
+from models.lexical_judge import calibrate_thresholds, DEFAULT_PASS_THRESHOLD
+from evaluate_niah_extension import DEFAULT_PROMPT as NIAH_PROMPT
+from visualize import create_niah_heatmaps
+from longmemeval.evaluate.evaluate_longmemeval import DEFAULT_PROMPT as LONGMEMEVAL_PROMPT
+from longmemeval.evaluate.visualize import visualize_many_longmemeval_results
+
+dotenv.load_dotenv()
+
+EXPERIMENT_PROMPTS = {"niah": NIAH_PROMPT, "longmemeval": LONGMEMEVAL_PROMPT}
+
+
+def niah_heatmaps(jobs: list[tuple[str, str]], output_dfs: list[pd.DataFrame], output_dir: str) -> list[dict]:
+    heatmaps = []
+    for (input_path, output_path), output_df in zip(jobs, output_dfs):
+        if not {'approximate_input_length', 'needle_depth'}.issubset(output_df.columns):
+            print(f"Skipping heatmap for {input_path}: no approximate_input_length/needle_depth columns")
+            continue
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        heatmaps.append(dict(
+            csv_path=output_path,
+            title=f"NIAH Performance - {name}",
+            output_path=os.path.join(output_dir, f"{name}_heatmap.png")
+        ))
+    return heatmaps
+
+
+def longmemeval_runs(jobs: list[tuple[str, str]], output_dir: str) -> list[dict]:
+    # Focused and full results pair up by name, e.g. gpt_4_1_longmemeval_focused_results.csv and
+    # gpt_4_1_longmemeval_full_results.csv, into one bar chart named gpt_4_1_longmemeval_results
+    conditions = {}
+    for input_path, output_path in jobs:
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        condition = next((condition for condition in ("focused", "full") if f"_{condition}" in name), None)
+        if condition is None:
+            print(f"Skipping bar chart for {input_path}: no _focused or _full in its name")
+            continue
+        conditions.setdefault(name.replace(f"_{condition}", "", 1), {})[condition] = output_path
+
+    runs = []
+    for name, paths in sorted(conditions.items()):
+        if set(paths) != {"focused", "full"}:
+            print(f"Skipping bar chart for {name}: needs both a focused and a full results file")
+            continue
+        runs.append(dict(
+            focused_filepath=paths["focused"],
+            full_filepath=paths["full"],
+            model_name=name,
+            output_path=os.path.join(output_dir, f"{name}.png")
+        ))
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate many result files through one shared, rate-limited judge and render their plots')
+
+    parser.add_argument('--input-glob', type=str, required=True,
+                       help='Glob of result CSV files to evaluate (quote it, e.g. "../../results/*_niah_results.csv")')
+    parser.add_argument('--output-dir', type=str, required=True,
+                       help='Directory for the evaluated CSVs (<input name>_evaluated.csv) and plots')
+    parser.add_argument('--experiment', type=str, default='niah', choices=sorted(EXPERIMENT_PROMPTS),
+                       help='Experiment the files come from, which sets the default judge prompt and the plots: niah heatmaps (default) or longmemeval focused/full bar charts')
+    parser.add_argument('--prompt', type=str, default=None,
+                       help="Judge prompt template (use {output}, {question}, {correct_answer} as placeholders; default: the --experiment's judge prompt)")
+    parser.add_argument('--model-name', type=str, default='gpt-4.1-2025-04-14',
+                       help='Model name to use (default: gpt-4.1-2025-04-14)')
+    parser.add_argument('--output-column', type=str, default='output',
+                       help='Column name containing model outputs (default: output)')
+    parser.add_argument('--question-column', type=str, default='question',
+                       help='Column name containing questions (default: question)')
+    parser.add_argument('--correct-answer-column', type=str, default='answer',
+                       help='Column name containing correct answers (default: answer)')
+    parser.add_argument('--max-tokens-per-minute', type=int, default=2_000_000,
+                       help='Maximum tokens per minute for rate limiting, shared by all files (default: 2_000_000)')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
+    parser.add_argument('--prejudge', action='store_true',
+                       help='Judge clear passes and fails locally by lexical match and send only the uncertain rows to the LLM judge')
+    parser.add_argument('--prejudge-pass-threshold', type=float, default=DEFAULT_PASS_THRESHOLD,
+                       help=f'Lexical score at or above which a row is judged true (default: {DEFAULT_PASS_THRESHOLD})')
+    parser.add_argument('--prejudge-calibration-path', type=str, default=None,
+                       help='Optional already-judged CSV to calibrate the pre-judge thresholds on (overrides --prejudge-pass-threshold; without it no row is judged false locally)')
+    parser.add_argument('--verdict-store-path', type=str, default=None,
+                       help='Optional SQLite file of judge verdicts; rows judged before with the same judge model, prompt and (question, answer, output) are not sent again')
+    parser.add_argument('--constrained', action='store_true',
+                       help='Ask for a schema-constrained true/false verdict and store its logprob confidence in llm_judge_output_confidence where the provider reports logprobs')
+    parser.add_argument('--no-plots', '--no-heatmaps', dest='no_plots', action='store_true',
+                       help='Only evaluate; skip the plots (NIAH files without approximate_input_length/needle_depth and unpaired LongMemEval files are always skipped)')
+    parser.add_argument('--plot-workers', type=int, default=None,
+                       help='Processes used to render the plots (default: all CPUs)')
+
+    args = parser.parse_args()
+
+    try:
+        input_paths = sorted(glob.glob(args.input_glob))
+        if not input_paths:
+            raise ValueError(f"No files match {args.input_glob}")
+
+        os.makedirs(args.output_dir, exist_ok=True)
+        jobs = [
+            (input_path, os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(input_path))[0]}_evaluated.csv"))
+            for input_path in input_paths
+        ]
+        print(f"Evaluating {len(jobs)} files")
+
+        prejudge_thresholds = None
+        if args.prejudge:
+            prejudge_thresholds = (args.prejudge_pass_threshold, None)
+            if args.prejudge_calibration_path:
+                prejudge_thresholds = calibrate_thresholds(
+                    pd.read_csv(args.prejudge_calibration_path),
+                    output_column=args.output_column,
+                    answer_column=args.correct_answer_column
+                )
+
+        judge = LLMJudge(
+            prompt=args.prompt or EXPERIMENT_PROMPTS[args.experiment],
+            model_name=args.model_name,
+            output_column=args.output_column,
+            question_column=args.question_column,
+            correct_answer_column=args.correct_answer_column,
+            verdict_store_path=args.verdict_store_path
+        )
+
+        output_dfs = judge.evaluate_many(
+            jobs=jobs,
+            max_tokens_per_minute=args.max_tokens_per_minute,
+            trace_path=args.trace_path,
+            prejudge_thresholds=prejudge_thresholds,
+            constrained=args.constrained
+        )
+
+        if args.no_plots:
+            return
+
+        if args.experiment == 'longmemeval':
+            runs = longmemeval_runs(jobs, args.output_dir)
+            if runs:
+                visualize_many_longmemeval_results(runs, workers=args.plot_workers)
+            return
+
+        heatmaps = niah_heatmaps(jobs, output_dfs, args.output_dir)
+        if heatmaps:
+            create_niah_heatmaps(heatmaps, workers=args.plot_workers)
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,37 +9,35 @@ import os
 import sys
 from typing import Optional, Tuple
 
-def create_niah_heatmap(csv_path: str, 
-                       title: Optional[str] = None,
-                       output_path: Optional[str] = None,
-                       figsize: Tuple[int, int] = (10, 6)) -> pd.DataFrame:
-    
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from plotting import render_figures
+
+def load_niah_accuracy(csv_path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
     df = pd.read_csv(csv_path)
     df = df.dropna(subset=['llm_judge_output'])
     print(f"Loaded {len(df)} valid samples from {csv_path}")
     
-    df['accuracy'] = df['llm_judge_output'].apply(
-        lambda x: 1 if str(x).lower() == 'true' else 0
-    )
+    df['accuracy'] = df['llm_judge_output'].astype(str).str.lower().eq('true').astype(int)
     
     all_input_lengths = sorted(df['approximate_input_length'].unique())
     all_needle_depths = sorted(df['needle_depth'].unique())
     
-    pivot_table = df.groupby(['approximate_input_length', 'needle_depth'])['accuracy'].mean().reset_index()
-    pivot_table = pivot_table.pivot(index='needle_depth', columns='approximate_input_length', values='accuracy')
-    
-    heatmap_data = pd.DataFrame(
-        index=all_needle_depths,
-        columns=all_input_lengths,
-        dtype=float
+    # Cells without samples stay NaN and are drawn grey
+    heatmap_data = (
+        df.groupby(['needle_depth', 'approximate_input_length'])['accuracy'].mean()
+        .unstack()
+        .reindex(index=all_needle_depths, columns=all_input_lengths)
+        .astype(float)
     )
-    
-    for depth in all_needle_depths:
-        for length in all_input_lengths:
-            if depth in pivot_table.index and length in pivot_table.columns:
-                value = pivot_table.loc[depth, length]
-                if pd.notna(value):
-                    heatmap_data.loc[depth, length] = value
+    return df, heatmap_data
+
+def plot_niah_heatmap(heatmap_data: pd.DataFrame,
+                      title: str,
+                      output_path: Optional[str] = None,
+                      figsize: Tuple[int, int] = (10, 6)) -> None:
+    all_input_lengths = list(heatmap_data.columns)
+    all_needle_depths = list(heatmap_data.index)
     
     plt.figure(figsize=figsize)
     
@@ -63,8 +61,6 @@ def create_niah_heatmap(csv_path: str,
     plt.xticks(range(len(all_input_lengths)), length_labels)
     plt.yticks(range(len(all_needle_depths)), [f"{int(d)}%" for d in all_needle_depths])
     
-    if title is None:
-        title = f"NIAH Performance - {os.path.basename(csv_path)}"
     plt.title(title)
     plt.xlabel('Input Length (tokens)')
     plt.ylabel('Needle Depth (%)')
@@ -74,25 +70,67 @@ def create_niah_heatmap(csv_path: str,
         plt.savefig(output_path, dpi=100, bbox_inches='tight', facecolor='white')
         print(f"Heatmap saved to: {output_path}")
     plt.close()
-    
+
+def print_niah_accuracy(df: pd.DataFrame) -> None:
     overall_accuracy = df['accuracy'].mean()
     print(f"\nOverall Accuracy: {overall_accuracy:.3f}")
     print(f"Total Samples: {len(df)}")
-    
-    return df
+
+def create_niah_heatmap(csv_path: str, 
+                       title: Optional[str] = None,
+                       output_path: Optional[str] = None,
+                       figsize: Tuple[int, int] = (10, 6)) -> pd.DataFrame:
+    return create_niah_heatmaps([dict(csv_path=csv_path, title=title, output_path=output_path, figsize=figsize)], workers=1)[0]
+
+def create_niah_heatmaps(heatmaps: list[dict], workers: Optional[int] = None) -> list[pd.DataFrame]:
+    # Each entry holds create_niah_heatmap's arguments. Files are aggregated here and the figures, which only draw the
+    # accuracy grids, are rendered in parallel worker processes, so re-plotting many models scales with the cores
+    dfs = []
+    figures = []
+    for heatmap in heatmaps:
+        df, heatmap_data = load_niah_accuracy(heatmap['csv_path'])
+        title = heatmap.get('title') or f"NIAH Performance - {os.path.basename(heatmap['csv_path'])}"
+        figures.append((plot_niah_heatmap, dict(heatmap_data=heatmap_data, title=title,
+                                                output_path=heatmap.get('output_path'),
+                                                figsize=heatmap.get('figsize', (10, 6)))))
+        dfs.append(df)
+    
+    render_figures(figures, workers)
+    
+    for df in dfs:
+        print_niah_accuracy(df)
+    return dfs
 
  
 def main():
     parser = argparse.ArgumentParser(description='Create NIAH performance heatmap')
-    parser.add_argument('--csv-path', type=str, required=True)
+    parser.add_argument('--csv-path', type=str, nargs='+', required=True,
+                       help='Evaluated results CSV; pass several together with --output-dir to re-plot many models at once')
     parser.add_argument('--title', type=str, default=None)
     parser.add_argument('--output-path', type=str, default=None)
+    parser.add_argument('--output-dir', type=str, default=None,
+                       help='Directory for <csv name>_heatmap.png of every --csv-path (used instead of --output-path and --title)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Processes used to render the heatmaps (default: all CPUs)')
     
     args = parser.parse_args()
     
     try:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            heatmaps = []
+            for csv_path in args.csv_path:
+                name = os.path.splitext(os.path.basename(csv_path))[0]
+                heatmaps.append(dict(csv_path=csv_path, title=f"NIAH Performance - {name}",
+                                     output_path=os.path.join(args.output_dir, f"{name}_heatmap.png")))
+            create_niah_heatmaps(heatmaps, workers=args.workers)
+            return
+        
+        if len(args.csv_path) > 1:
+            raise ValueError("Pass --output-dir to plot more than one --csv-path")
+        
         create_niah_heatmap(
-            csv_path=args.csv_path,
+            csv_path=args.csv_path[0],
             title=args.title,
             output_path=args.output_path
         )
@@ -4,10 +4,13 @@ import os
 import dotenv
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'evaluate'))
 
 from models.providers.openai import OpenAIProvider
 from models.providers.anthropic import AnthropicProvider
 from models.providers.google import GoogleProvider
+from models.llm_judge import LLMJudge, PipelinedJudge
+from evaluate_niah_extension import DEFAULT_PROMPT as JUDGE_PROMPT
 
 dotenv.load_dotenv()
 
@@ -42,21 +45,48 @@ def main():
                        help='Maximum context length in tokens')
     parser.add_argument('--max-tokens-per-minute', type=int, required=True,
                        help='Maximum tokens per minute for rate limits')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
+    parser.add_argument('--judge-output-path', type=str, default=None,
+                       help='Optional evaluated CSV path; when set, each finished row is judged while generation is still running')
+    parser.add_argument('--judge-model-name', type=str, default='gpt-4.1-2025-04-14',
+                       help='Judge model for the pipelined judge (default: gpt-4.1-2025-04-14)')
+    parser.add_argument('--judge-provider', type=str, default='openai',
+                       choices=['openai', 'anthropic', 'google', 'ollama'],
+                       help='Provider of the pipelined judge (default: openai)')
+    parser.add_argument('--judge-max-tokens-per-minute', type=int, default=2_000_000,
+                       help='Tokens per minute for the pipelined judge, separate from the generation limit (default: 2_000_000)')
     
     args = parser.parse_args()
     
     try:
         provider = get_provider(args.provider, args.model_name)
+
+        judge_pipeline = None
+        if args.judge_output_path:
+            judge = LLMJudge(prompt=JUDGE_PROMPT, model_name=args.judge_model_name, provider=args.judge_provider, output_column=args.output_column)
+            judge_pipeline = PipelinedJudge(judge, args.output_path, args.judge_output_path, args.judge_max_tokens_per_minute)
+            judge_pipeline.start()
         
-        provider.main(
-            input_path=args.input_path,
-            output_path=args.output_path,
-            input_column=args.input_column,
-            output_column=args.output_column,
-            model_name=args.model_name,
-            max_context_length=args.max_context_length,
-            max_tokens_per_minute=args.max_tokens_per_minute
-        )
+        # The judge thread is joined even if generation fails, so rows generated so far are still judged and saved
+        try:
+            provider.main(
+                input_path=args.input_path,
+                output_path=args.output_path,
+                input_column=args.input_column,
+                output_column=args.output_column,
+                model_name=args.model_name,
+                max_context_length=args.max_context_length,
+                max_tokens_per_minute=args.max_tokens_per_minute,
+                trace_path=args.trace_path,
+                on_result=judge_pipeline.submit if judge_pipeline else None
+            )
+        finally:
+            if judge_pipeline:
+                judge_pipeline.close()
+
+        if judge_pipeline:
+            print(f"Judged results saved to: {args.judge_output_path}")
         
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
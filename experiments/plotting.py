@@ -0,0 +1,36 @@
+import os
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from typing import Any, Callable
+
+
+def binned_means(df: pd.DataFrame, value_column: str, position_column: str, group_column: str, groups: list = None, num_bins: int = 20) -> pd.DataFrame:
+    # Mean of value_column per group and position bin, with bins np.linspace(0, group - 1, num_bins + 1) per group.
+    # Like the per-mask loop this replaces, a bin is [left, right), so the last position falls outside; empty bins are 0.
+    bins = pd.Series(-1, index=df.index)
+    for group, positions in df.groupby(group_column)[position_column]:
+        edges = np.linspace(0, group - 1, num_bins + 1)
+        bins.loc[positions.index] = np.digitize(positions, edges) - 1
+
+    in_range = (bins >= 0) & (bins < num_bins)
+    means = df[in_range].groupby([df.loc[in_range, group_column], bins[in_range]])[value_column].mean().unstack(fill_value=0)
+    means = means.reindex(columns=range(num_bins), fill_value=0)
+    if groups is not None:
+        means = means.reindex(index=groups, fill_value=0)
+    return means.astype(float)
+
+
+def render_figures(jobs: list[tuple[Callable, dict[str, Any]]], workers: int = None) -> None:
+    # Each job is (plot function, keyword arguments) and gets only precomputed aggregates, so it is cheap to send to a
+    # worker process; plot functions must be module-level so that workers can import them
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        for function, kwargs in jobs:
+            function(**kwargs)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, **kwargs) for function, kwargs in jobs]
+        for future in futures:
+            future.result()
@@ -5,10 +5,20 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import Levenshtein
+import concurrent.futures
+from functools import partial
 import dotenv
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from plotting import binned_means, render_figures
+
 dotenv.load_dotenv()
 
+# Scoring takes ~0.2 ms per row and starting the pool ~0.1 s, so smaller frames, such as one word pair's ~1,100 rows,
+# are scored in this process
+PARALLEL_MIN_ROWS = 2000
+
 def normalized_levenshtein_score(gold: str, pred: str) -> float:
     if not gold or not pred:
         return 0.0
@@ -17,107 +27,115 @@ def normalized_levenshtein_score(gold: str, pred: str) -> float:
     max_len = max(len(gold), len(pred))
     return 1 - (distance / max_len)
 
-def check_delta(output: str, gold: str) -> int:
-    return len(gold.split()) - len(output.split())
+EDIT_OPS = {"insert": "word_insertions", "delete": "word_deletions", "replace": "word_substitutions"}
 
-def modified_word_present(row: pd.Series, modified_word: str, output_column: str) -> bool:
-    if pd.isna(row[output_column]):
-        return False
-    
-    if row['index'] == row['num_words'] - 1:
-        unique_word = " " + modified_word
-    else:
-        unique_word = modified_word + " "
-    
-    return unique_word in row[output_column]
+def align_words(output_words: list[str], num_words: int, index: int, common_word: str, modified_word: str) -> dict:
+    # Each distinct word becomes one character, so the (bit-parallel) string edit distance runs over words, not characters
+    vocabulary = {common_word: 0, modified_word: 1}
+    gold_ids = chr(0) * index + chr(1) + chr(0) * (num_words - index - 1)
+    output_ids = "".join(chr(vocabulary.setdefault(word, len(vocabulary))) for word in output_words)
 
-def check_correct_position(row: pd.Series, modified_word: str, output_column: str) -> bool:
-    if not row['modified_word_present'] or pd.isna(row[output_column]):
-        return False
-    
-    try:
-        if row['index'] == row['num_words'] - 1:
-            unique_word = " " + modified_word
-        else:
-            unique_word = modified_word + " "
-        
-        gold_index = row["gold"].index(unique_word)
-        output_index = row[output_column].index(unique_word)
-        return gold_index == output_index
-    
-    except ValueError:
-        return False
+    # Edit operations turn gold into output: "insert" is an extra output word, "delete" a missing gold word
+    edits = Levenshtein.editops(gold_ids, output_ids)
+    alignment = {column: 0 for column in EDIT_OPS.values()}
+    for op, _, _ in edits:
+        alignment[EDIT_OPS[op]] += 1
+
+    max_len = max(len(gold_ids), len(output_ids))
+    alignment["word_levenshtein_score"] = 1 - len(edits) / max_len if output_ids else 0.0
+    alignment["first_edit_position"] = edits[0][1] if edits else None
+    alignment["word_edits"] = [(op, gold_position) for op, gold_position, _ in edits]
+    return alignment
 
-def other_word_exists(output: str, common_word: str, modified_word: str) -> bool:
+def get_unique_word(modified_word: str, index: int, num_words: int) -> str:
+    # The modified word is matched with its neighbouring space so that e.g. "apple" doesn't match inside "apples"
+    if index == num_words - 1:
+        return " " + modified_word
+    return modified_word + " "
+
+def evaluate_row(gold: str, output: str, num_words: int, index: int, common_word: str, modified_word: str, levenshtein_level: str = "char", word_alignment: bool = False) -> dict:
+    # Outputs are aligned word by word only when the word-level score or the word edit reports need it
+    align = word_alignment or levenshtein_level == "word"
     if pd.isna(output):
-        return True
-    
-    words = output.split()
-    
-    for i, word in enumerate(words):
-        if word not in [common_word, modified_word]:
-            return True
-    
-    return False
+        return {
+            "levenshtein_score": 0.0,
+            "modified_word_present": False,
+            "correct_position": False,
+            "delta": num_words,
+            "other_word_present": True,
+            "refusal": True,
+            **(align_words([], num_words, index, common_word, modified_word) if align else {}),
+        }
 
-def filter_refusals(df: pd.DataFrame, common_word: str, modified_word: str, output_column: str) -> pd.DataFrame | None:
-    other_word_present_list = []
-    
-    for i, row in df.iterrows():
-        if pd.isna(row[output_column]):
-            other_word_present = True
-        else:
-            other_word_present = other_word_exists(row[output_column], common_word, modified_word)
-        
-        other_word_present_list.append(other_word_present)
-    
-    other_word_df = df[other_word_present_list]
-    
-    if len(other_word_df) > 0:
-        df_refusals = other_word_df[
-            (pd.isna(other_word_df[output_column])) | 
-            (other_word_df[output_column].str.count(common_word) < 15)
-        ] # good initial filter, but manual check is still highly recommended
+    # Each output is split once and all per-row metrics are computed from those words; gold has num_words words by construction
+    output_words = output.split()
+    unique_word = get_unique_word(modified_word, index, num_words)
+    present = unique_word in output
+    other_word_present = not set(output_words) <= {common_word, modified_word}
+    alignment = align_words(output_words, num_words, index, common_word, modified_word) if align else {}
+
+    return {
+        # The character-level score is the reported metric by default; the word-level one is only cheaper on outputs full of other words
+        "levenshtein_score": normalized_levenshtein_score(gold, output) if levenshtein_level == "char" else alignment["word_levenshtein_score"],
+        "modified_word_present": present,
+        "correct_position": present and gold.find(unique_word) == output.find(unique_word),
+        "delta": num_words - len(output_words),
+        "other_word_present": other_word_present,
+        # good initial filter, but manual check is still highly recommended
+        "refusal": other_word_present and output.count(common_word) < 15,
+        **alignment,
+    }
+
+def evaluate_rows(rows: list[tuple[str, str, int, int]], common_word: str, modified_word: str, levenshtein_level: str = "char", word_alignment: bool = False) -> list[dict]:
+    return [evaluate_row(gold, output, num_words, index, common_word, modified_word, levenshtein_level, word_alignment) for gold, output, num_words, index in rows]
+
+def score_outputs(df: pd.DataFrame, common_word: str, modified_word: str, output_column: str = "output", workers: int = None, levenshtein_level: str = "char", word_alignment: bool = False) -> pd.DataFrame:
+    rows = list(zip(df["gold"], df[output_column], df["num_words"], df["index"]))
+    # More processes than CPUs only add start-up and pickling cost
+    workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1)
+
+    if workers == 1 or len(rows) < PARALLEL_MIN_ROWS:
+        results = evaluate_rows(rows, common_word, modified_word, levenshtein_level, word_alignment)
     else:
-        df_refusals = other_word_df
+        chunk_size = max(1, -(-len(rows) // (workers * 4)))
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = executor.map(partial(evaluate_rows, common_word=common_word, modified_word=modified_word, levenshtein_level=levenshtein_level, word_alignment=word_alignment), chunks)
+            results = [result for chunk_result in chunk_results for result in chunk_result]
+
+    return pd.DataFrame(results, index=df.index)
+
+def filter_refusals(df: pd.DataFrame) -> pd.DataFrame | None:
+    df_refusals = df[df["refusal"]]
     
     print(f"Number of refusals: {len(df_refusals)} out of {len(df)}, {len(df_refusals)/len(df) * 100:.1f}%")
     
     return df_refusals if len(df_refusals) > 0 else None
 
-def create_binned_plot(df: pd.DataFrame, unique_num_words: list[int], metric_column: str, 
+# (metric column, y label, title, color, file name) of the position-binned figures
+BINNED_PLOTS = [
+    ("levenshtein_score", "Normalized Levenshtein Score", "Normalized Levenshtein Score", "#2FB874", "levenshtein_score.png"),
+    ("modified_word_present", "Modified Word Present", "Modified Word Present", "#EA5412", "modified_word_present.png"),
+    ("correct_position", "Position Accuracy", "Position Accuracy", "#EBB125", "position_accuracy.png"),
+    ("delta", "num_words - output length", "Number of Words Delta", "#7E8E9E", "word_count_delta.png"),
+]
+
+def compute_binned_metric(df: pd.DataFrame, unique_num_words: list[int], metric_column: str) -> dict[int, list[float]]:
+    if metric_column == 'correct_position':
+        df = df[~df['other_word_present'] & df['modified_word_present']]
+    
+    means = binned_means(df, metric_column, "index", "num_words", groups=unique_num_words)
+    return {num_words: means.loc[num_words].tolist() for num_words in unique_num_words}
+
+def create_binned_plot(bin_values: dict[int, list[float]], metric_column: str, 
                       ylabel: str, title: str, color: str, output_path: str) -> None:
     fig, axes = plt.subplots(4, 3, figsize=(15, 12))
     axes = axes.flatten()
     
-    for i, num_words in enumerate(unique_num_words):
-        df_subset = df[df["num_words"] == num_words].copy()
-        
-        if metric_column == 'correct_position':
-            other_word_mask = []
-            for _, row in df_subset.iterrows():
-                other_word_mask.append(other_word_exists(row['output'], df['common_word'].iloc[0], 
-                                                       df['modified_word'].iloc[0]))
-            df_subset = df_subset[~np.array(other_word_mask)]
-            df_subset = df_subset[df_subset['modified_word_present']]
-        
-        bins = np.linspace(0, num_words-1, 21)
-        bin_values = []
-        
-        for j in range(20):
-            mask = (df_subset["index"] >= bins[j]) & (df_subset["index"] < bins[j+1])
-            if mask.any():
-                if metric_column == 'delta':
-                    bin_values.append(df_subset[mask][metric_column].mean())
-                else:
-                    bin_values.append(df_subset[mask][metric_column].mean())
-            else:
-                bin_values.append(0)
-        
-        x_positions = np.linspace(0, 100, 20)
-        
+    x_positions = np.linspace(0, 100, 20)
+    for i, (num_words, values) in enumerate(bin_values.items()):
         if metric_column == 'delta':
-            for idx, val in enumerate(bin_values):
+            for idx, val in enumerate(values):
                 xpos = x_positions[idx]
                 if val < 0:
                     axes[i].bar(xpos, val, color=color, alpha=0.7, width=4, hatch='///', 
@@ -126,7 +144,7 @@ def create_binned_plot(df: pd.DataFrame, unique_num_words: list[int], metric_col
                     axes[i].bar(xpos, val, color=color, alpha=0.7, width=4)
             axes[i].axhline(0, color='black', linewidth=0.8, linestyle='--')
         else:
-            axes[i].bar(x_positions, bin_values, color=color, alpha=0.7, width=4)
+            axes[i].bar(x_positions, values, color=color, alpha=0.7, width=4)
         
         axes[i].set_title(f'{num_words} words')
         axes[i].set_ylabel(ylabel)
@@ -134,8 +152,8 @@ def create_binned_plot(df: pd.DataFrame, unique_num_words: list[int], metric_col
         axes[i].set_xlim(-5, 105)
         
         if metric_column == 'delta':
-            min_val = min(bin_values)
-            max_val = max(bin_values)
+            min_val = min(values)
+            max_val = max(values)
             pad = (max_val - min_val) * 0.1 if max_val != min_val else 1
             axes[i].set_ylim(min_val - pad, max_val + pad)
         else:
@@ -146,27 +164,67 @@ def create_binned_plot(df: pd.DataFrame, unique_num_words: list[int], metric_col
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
     plt.close()
 
-def create_token_count_plot(df: pd.DataFrame, model_name: str, common_word: str, 
-                           modified_word: str, output_path: str) -> None:
-    color = "#90B8B6"
+def get_word_edits(df: pd.DataFrame, edits: pd.Series) -> pd.DataFrame:
+    # One row per edit: each output's columns are repeated by its edit count rather than looked up edit by edit
+    edits = edits.loc[df.index]
+    flat_edits = [edit for row_edits in edits for edit in row_edits]
+    word_edits = df[["id", "num_words", "index"]].iloc[np.repeat(np.arange(len(df)), edits.str.len())].reset_index(drop=True)
+    word_edits["op"] = [op for op, _ in flat_edits]
+    word_edits["gold_position"] = np.array([gold_position for _, gold_position in flat_edits], dtype=int)
+    word_edits["relative_position"] = word_edits["gold_position"] / word_edits["num_words"]
+    return word_edits
+
+def compute_edit_positions(df: pd.DataFrame, word_edits: pd.DataFrame, unique_num_words: list[int]) -> dict[int, dict[str, np.ndarray]]:
+    # Edits per output in 20 relative-position bins, per word count and edit op
+    bins = np.linspace(0, 1, 21)
+    rows = df["num_words"].value_counts()
+    edits_per_output = {}
+    for num_words in unique_num_words:
+        edits_subset = word_edits[word_edits["num_words"] == num_words]
+        edits_per_output[num_words] = {}
+        for op in EDIT_OPS:
+            counts, _ = np.histogram(edits_subset.loc[edits_subset["op"] == op, "relative_position"].clip(upper=1), bins=bins)
+            edits_per_output[num_words][op] = counts / max(rows.get(num_words, 0), 1)
+    return edits_per_output
+
+def create_edit_position_plot(edits_per_output: dict[int, dict[str, np.ndarray]], title: str, output_path: str) -> None:
+    colors = {"insert": "#2FB874", "delete": "#EA5412", "replace": "#7E8E9E"}
+    fig, axes = plt.subplots(4, 3, figsize=(15, 12))
+    axes = axes.flatten()
     
-    plt.figure(figsize=(10, 6))
+    x_positions = np.linspace(0, 100, 20)
+    for i, (num_words, op_values) in enumerate(edits_per_output.items()):
+        bottom = np.zeros(20)
+        for op, color in colors.items():
+            axes[i].bar(x_positions, op_values[op], bottom=bottom, color=color, alpha=0.7, width=4, label=op)
+            bottom += op_values[op]
+        
+        axes[i].set_title(f'{num_words} words')
+        axes[i].set_ylabel('Edits per output')
+        axes[i].set_xlabel('Gold Word Position (%)')
+        axes[i].set_xlim(-5, 105)
     
-    num_bins = 12
+    axes[0].legend()
+    plt.tight_layout()
+    plt.suptitle(title, fontsize=18, y=1.02)
+    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.close()
+
+def compute_token_count_curve(df: pd.DataFrame, num_bins: int = 12) -> tuple[list[float], list[float]]:
+    # Also leaves the log-spaced token_bin column on df, which is saved with the evaluated results
     min_token = max(df["token_count"].min(), 1)
     bins = np.logspace(np.log10(min_token), np.log10(df["token_count"].max()), num_bins + 1)
     df["token_bin"] = pd.cut(df["token_count"], bins=bins, include_lowest=True, labels=False)
     
-    bin_centers = []
-    avg_scores = []
-    for bin_idx in range(num_bins):
-        bin_df = df[df["token_bin"] == bin_idx]
-        if not bin_df.empty:
-            avg_scores.append(bin_df["levenshtein_score"].mean())
-            left = bins[bin_idx]
-            right = bins[bin_idx + 1]
-            bin_centers.append(np.sqrt(left * right))
+    avg_scores = df.groupby("token_bin")["levenshtein_score"].mean()
+    bin_centers = [np.sqrt(bins[int(bin_idx)] * bins[int(bin_idx) + 1]) for bin_idx in avg_scores.index]
+    return bin_centers, avg_scores.tolist()
+
+def create_token_count_plot(bin_centers: list[float], avg_scores: list[float], model_name: str, common_word: str, 
+                           modified_word: str, output_path: str) -> None:
+    color = "#90B8B6"
     
+    plt.figure(figsize=(10, 6))
     plt.plot(bin_centers, avg_scores, marker='o', linestyle='-', color=color)
     plt.xscale('log')
     plt.xlabel('Input Length (Tokens)')
@@ -178,35 +236,26 @@ def create_token_count_plot(df: pd.DataFrame, model_name: str, common_word: str,
     plt.close()
 
 def evaluate_repeated_words(input_path: str, output_dir: str, common_word: str, 
-                           modified_word: str, model_name: str) -> tuple[pd.DataFrame, dict]:
+                           modified_word: str, model_name: str, workers: int = None, levenshtein_level: str = "char",
+                           word_alignment: bool = False) -> tuple[pd.DataFrame, dict]:
     df = pd.read_csv(input_path)
     
     df["num_words"] = df["id"].str.split("_").str[0].astype(int)
     df["index"] = df["id"].str.split("_").str[1].astype(int)
     
-    levenshtein_scores = []
-    for i, row in df.iterrows():
-        score = normalized_levenshtein_score(row["gold"], row["output"])
-        levenshtein_scores.append(score)
-    
-    df["levenshtein_score"] = levenshtein_scores
-    
-    df["modified_word_present"] = df.apply(
-        lambda row: modified_word_present(row, modified_word, "output"), axis=1
-    )
-    
-    df["correct_position"] = df.apply(
-        lambda row: check_correct_position(row, modified_word, "output"), axis=1
-    )
-    
-    df["delta"] = df.apply(
-        lambda row: check_delta(row["output"], row["gold"]), axis=1
-    )
+    scores = score_outputs(df, common_word, modified_word, "output", workers, levenshtein_level, word_alignment)
+    for column in ["levenshtein_score", "modified_word_present", "correct_position", "delta"]:
+        df[column] = scores[column]
     
     df["common_word"] = common_word
     df["modified_word"] = modified_word
+    df["other_word_present"] = scores["other_word_present"]
+    df["refusal"] = scores["refusal"]
+    if word_alignment:
+        for column in ["word_levenshtein_score", *EDIT_OPS.values(), "first_edit_position"]:
+            df[column] = scores[column]
     
-    refusals = filter_refusals(df, common_word, modified_word, "output")
+    refusals = filter_refusals(df)
     if refusals is not None:
         filtered_df = df[~df["output"].isin(refusals["output"])]
     else:
@@ -218,28 +267,26 @@ def evaluate_repeated_words(input_path: str, output_dir: str, common_word: str,
     
     os.makedirs(output_dir, exist_ok=True)
     
-    create_token_count_plot(filtered_df, model_name, common_word, modified_word,
-                           os.path.join(output_dir, "token_count_performance.png"))
-    
-    create_binned_plot(filtered_df, unique_num_words, "levenshtein_score",
-                      "Normalized Levenshtein Score", 
-                      f"Normalized Levenshtein Score - {model_name}",
-                      "#2FB874", os.path.join(output_dir, "levenshtein_score.png"))
-    
-    create_binned_plot(filtered_df, unique_num_words, "modified_word_present",
-                      "Modified Word Present", 
-                      f"Modified Word Present - {model_name}",
-                      "#EA5412", os.path.join(output_dir, "modified_word_present.png"))
-    
-    create_binned_plot(filtered_df, unique_num_words, "correct_position",
-                      "Position Accuracy", 
-                      f"Position Accuracy - {model_name}",
-                      "#EBB125", os.path.join(output_dir, "position_accuracy.png"))
-
-    create_binned_plot(filtered_df, unique_num_words, "delta",
-                      "num_words - output length", 
-                      f"Number of Words Delta - {model_name}",
-                      "#7E8E9E", os.path.join(output_dir, "word_count_delta.png"))
+    # Aggregates are computed once here; the figures only draw them, so they render in parallel worker processes
+    bin_centers, avg_scores = compute_token_count_curve(filtered_df)
+    
+    figures = [
+        (create_token_count_plot, dict(bin_centers=bin_centers, avg_scores=avg_scores, model_name=model_name,
+                                       common_word=common_word, modified_word=modified_word,
+                                       output_path=os.path.join(output_dir, "token_count_performance.png"))),
+    ]
+    if word_alignment:
+        word_edits = get_word_edits(filtered_df, scores["word_edits"])
+        word_edits.to_csv(os.path.join(output_dir, "word_edits.csv"), index=False)
+        figures.append((create_edit_position_plot, dict(edits_per_output=compute_edit_positions(filtered_df, word_edits, unique_num_words),
+                                                        title=f"Word Edits by Position - {model_name}",
+                                                        output_path=os.path.join(output_dir, "word_edit_positions.png"))))
+    for metric_column, ylabel, title, color, filename in BINNED_PLOTS:
+        figures.append((create_binned_plot, dict(bin_values=compute_binned_metric(filtered_df, unique_num_words, metric_column),
+                                                 metric_column=metric_column, ylabel=ylabel,
+                                                 title=f"{title} - {model_name}", color=color,
+                                                 output_path=os.path.join(output_dir, filename))))
+    render_figures(figures, workers)
     
     filtered_df.to_csv(os.path.join(output_dir, "evaluated_results.csv"), index=False)
     
@@ -266,6 +313,12 @@ def main():
                        help='Modified word that was inserted')
     parser.add_argument('--model-name', type=str, required=True,
                        help='Model name for plot titles')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Processes used to score outputs and render plots (default: all CPUs; 1 does both in this process)')
+    parser.add_argument('--levenshtein-level', type=str, default='char', choices=['char', 'word'],
+                       help='Edit distance behind levenshtein_score and its plots: char (default) or word-level alignment, faster only on long outputs full of other words')
+    parser.add_argument('--word-edits', action='store_true',
+                       help='Also align outputs word by word: word-level columns, word_edits.csv and word_edit_positions.png')
     
     args = parser.parse_args()
     
@@ -275,7 +328,10 @@ def main():
             output_dir=args.output_dir,
             common_word=args.common_word,
             modified_word=args.modified_word,
-            model_name=args.model_name
+            model_name=args.model_name,
+            workers=args.workers,
+            levenshtein_level=args.levenshtein_level,
+            word_alignment=args.word_edits
         )
         
         print(f"Evaluation complete. Results saved to: {args.output_dir}")
@@ -1,10 +1,15 @@
 import argparse
+import csv
+import hashlib
+import json
 import sys
 import os
+import tempfile
 import pandas as pd
 import tiktoken
 from tqdm import tqdm
 import dotenv
+from typing import Iterator
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
@@ -15,42 +20,131 @@ from models.providers.google import GoogleProvider
 dotenv.load_dotenv()
 
 
-def create_variations(common_word: str, modified_word: str, num_words: int) -> tuple[list[str], list[str], pd.DataFrame]:
+NUM_WORD_VARIATIONS = [25, 50, 75, 100, 250, 500, 750, 1000, 2500, 5000, 7500, 10000]
+INPUT_COLUMNS = ["id", "prompt", "gold", "token_count", "max_output_tokens"]
+PROMPT_HEAD = "Simply replicate the following text, output the exact same text:"
+
+TOKENIZER = "o200k_base"
+
+# Generated inputs are cached next to the repository's data, wherever the script is run from; bump the version
+# whenever a change to the generator changes the rows it writes
+DEFAULT_INPUT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data', 'repeated_words_inputs'))
+INPUT_CACHE_VERSION = 1
+
+# Every n-th variation of a setting is still encoded exactly to confirm the token model
+EXACT_TOKEN_CHECK_EVERY = 25
+
+
+# Token counts of repeated-word prompts from cached encodings of their pieces: the prompt head and the
+# space-prefixed common and modified words. The sum is exact only if no token spans a join between pieces.
+class RepeatedWordTokenModel:
+    def __init__(self, encoding: tiktoken.Encoding, common_word: str, modified_word: str, head: str = PROMPT_HEAD):
+        self.encoding = encoding
+        self.pieces = {"head": head, "common": f" {common_word}", "modified": f" {modified_word}"}
+        self.counts = {name: len(self.encode(piece)) for name, piece in self.pieces.items()}
+
+        joins = [
+            ("head", "common"),
+            ("head", "modified"),
+            ("common", "common"),
+            ("common", "modified"),
+            ("modified", "common"),
+            ("common", "common", "common"),
+        ]
+        self.linear = all(self.is_clean_join(join) for join in joins)
+        if not self.linear:
+            print(f"Tokens span word boundaries for '{common_word}' | '{modified_word}', encoding every prompt exactly")
+
+    def encode(self, text: str) -> list[int]:
+        return self.encoding.encode(text, disallowed_special=())
+
+    def is_clean_join(self, names: tuple[str, ...]) -> bool:
+        joined = self.encode("".join(self.pieces[name] for name in names))
+        return joined == [token for name in names for token in self.encode(self.pieces[name])]
+
+    def count(self, num_words: int) -> int | None:
+        if not self.linear:
+            return None
+        return self.counts["head"] + (num_words - 1) * self.counts["common"] + self.counts["modified"]
+
+
+# A streamed output is cancelled once it is this fraction (at least GUARD_MIN_WORDS words) longer than gold, or once
+# more than the divergence fraction of its words (after GUARD_MIN_WORDS) differ from gold at the same position
+DEFAULT_GUARD_LENGTH_TOLERANCE = 0.1
+DEFAULT_GUARD_MAX_DIVERGENCE = 0.5
+GUARD_MIN_WORDS = 20
+
+
+class RepeatedWordsGuard:
+    def __init__(self, gold: str, length_tolerance: float = DEFAULT_GUARD_LENGTH_TOLERANCE, max_divergence: float = DEFAULT_GUARD_MAX_DIVERGENCE):
+        self.gold_words = gold.split()
+        self.max_words = len(self.gold_words) + max(GUARD_MIN_WORDS, int(len(self.gold_words) * length_tolerance))
+        self.max_divergence = max_divergence
+        self.pending = ""
+        self.words = 0
+        self.mismatches = 0
+
+    def __call__(self, text: str) -> str | None:
+        # Only complete words are compared; a word at the end of a chunk may continue in the next one. Comparing
+        # by position is enough here: a shifted modified word only costs a couple of mismatches
+        text = self.pending + text
+        words = text.split()
+        self.pending = words.pop() if words and not text[-1].isspace() else ""
+
+        for word in words:
+            if self.words >= len(self.gold_words) or word != self.gold_words[self.words]:
+                self.mismatches += 1
+            self.words += 1
+
+        if self.words > self.max_words:
+            return "exceeds_gold_length"
+        if self.words >= GUARD_MIN_WORDS and self.mismatches / self.words > self.max_divergence:
+            return "diverged"
+        return None
+
+
+def get_variation_indices(num_words: int) -> list[int]:
     if num_words < 100:
-        indices = list(range(num_words))
-    else:
-        step = num_words // 100
-        indices = list(range(0, num_words, step))
-        if indices[-1] != num_words - 1:
-            indices.append(num_words - 1)
+        return list(range(num_words))
 
-    variations = [
-        " ".join([modified_word if j == i else common_word for j in range(num_words)])
-        for i in indices
-    ]
-    ids = [str(i) for i in indices]
-    df = pd.DataFrame({"index": ids, "gold": variations})
-    return variations, ids, df
+    step = num_words // 100
+    indices = list(range(0, num_words, step))
+    if indices[-1] != num_words - 1:
+        indices.append(num_words - 1)
+    return indices
 
 
-def create_input_df(common_word: str, modified_word: str, model_max_output_tokens: int) -> pd.DataFrame:
-    num_word_variations = [25, 50, 75, 100, 250, 500, 750, 1000, 2500, 5000, 7500, 10000]
+def create_variations(common_word: str, modified_word: str, num_words: int, base: str = None) -> Iterator[tuple[str, str]]:
+    # Each variation is the shared base string with the modified word sliced in at its character offset
+    if base is None:
+        base = " ".join([common_word] * num_words)
+
+    stride = len(common_word) + 1
+    for i in get_variation_indices(num_words):
+        offset = i * stride
+        yield str(i), base[:offset] + modified_word + base[offset + len(common_word):]
+
 
-    custom_ids = []
-    prompts = []
-    gold = []
-    input_tokens_list = []
-    max_output_tokens_list = []
+def iter_input_rows(common_word: str, modified_word: str, model_max_output_tokens: int, exact_check_every: int = EXACT_TOKEN_CHECK_EVERY) -> Iterator[dict]:
+    encoding = tiktoken.get_encoding(TOKENIZER)
+    token_model = RepeatedWordTokenModel(encoding, common_word, modified_word)
 
-    encoding = tiktoken.get_encoding("o200k_base")
+    # The base string of every setting is a prefix of the longest one
+    longest_base = " ".join([common_word] * max(NUM_WORD_VARIATIONS))
 
-    for num_words in num_word_variations:
-        variations, ids, df = create_variations(common_word, modified_word, num_words)
+    for num_words in NUM_WORD_VARIATIONS:
+        base = longest_base[:num_words * (len(common_word) + 1) - 1]
 
-        for id, variation in zip(ids, variations):
-            prompt = f"Simply replicate the following text, output the exact same text: {variation}"
+        for position, (id, variation) in enumerate(create_variations(common_word, modified_word, num_words, base)):
+            prompt = f"{PROMPT_HEAD} {variation}"
 
-            input_tokens = len(encoding.encode(prompt, disallowed_special=()))
+            input_tokens = token_model.count(num_words)
+            if input_tokens is None or position % exact_check_every == 0:
+                exact_tokens = len(token_model.encode(prompt))
+                if input_tokens is not None and exact_tokens != input_tokens:
+                    print(f"Token model predicted {input_tokens} tokens but {num_words}_{id} has {exact_tokens}, encoding every prompt exactly")
+                    token_model.linear = False
+                input_tokens = exact_tokens
             
             max_output_tokens = input_tokens * 2
 
@@ -58,22 +152,91 @@ def create_input_df(common_word: str, modified_word: str, model_max_output_token
                 print(f"Output tokens ({max_output_tokens}) exceeds max output tokens ({model_max_output_tokens})")
                 break
 
-            input_tokens_list.append(input_tokens)
-            max_output_tokens_list.append(max_output_tokens)
-            custom_id = f"{num_words}_{id}"
-            custom_ids.append(custom_id)
-            prompts.append(prompt)
-            gold.append(variation)
+            yield {
+                "id": f"{num_words}_{id}",
+                "prompt": prompt,
+                "gold": variation,
+                "token_count": input_tokens,
+                "max_output_tokens": max_output_tokens,
+            }
 
-    df = pd.DataFrame({
-        "id": custom_ids, 
-        "prompt": prompts, 
-        "gold": gold, 
-        "token_count": input_tokens_list, 
-        "max_output_tokens": max_output_tokens_list
-    })
 
-    return df
+def default_file_mode() -> int:
+    # The mode open() gives new files; the umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_input_csv(common_word: str, modified_word: str, model_max_output_tokens: int, input_path: str) -> int:
+    # Rows are written as they are generated, so only one variation is held in memory at a time. They go to a
+    # temporary file that replaces input_path only once complete, so readers never see a partial file
+    rows = 0
+    input_dir = os.path.dirname(os.path.abspath(input_path))
+    os.makedirs(input_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=input_dir, prefix=".repeated_words_input_", suffix=".csv.tmp")
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=INPUT_COLUMNS, lineterminator='\n')
+            writer.writeheader()
+            for row in iter_input_rows(common_word, modified_word, model_max_output_tokens):
+                writer.writerow(row)
+                rows += 1
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_path, default_file_mode())
+        os.replace(temp_path, input_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return rows
+
+
+def input_cache_key(common_word: str, modified_word: str, model_max_output_tokens: int) -> str:
+    fields = {
+        "version": INPUT_CACHE_VERSION,
+        "common_word": common_word,
+        "modified_word": modified_word,
+        "num_word_variations": NUM_WORD_VARIATIONS,
+        "prompt_head": PROMPT_HEAD,
+        "tokenizer": TOKENIZER,
+        "model_max_output_tokens": model_max_output_tokens,
+    }
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def get_input_csv(common_word: str, modified_word: str, model_max_output_tokens: int, cache_dir: str = DEFAULT_INPUT_CACHE_DIR) -> str:
+    # Inputs are content-addressed: a run with the same settings reuses the file, and runs with different settings
+    # (e.g. another model's output limit) never overwrite each other's inputs
+    key = input_cache_key(common_word, modified_word, model_max_output_tokens)
+    input_path = os.path.join(cache_dir, f"repeated_words_input_{common_word}_{modified_word}_{key[:16]}.csv")
+    if os.path.exists(input_path):
+        print(f"Reusing cached input data: {input_path}")
+        return input_path
+
+    print(f"Creating input data for {common_word} | {modified_word}")
+    rows = write_input_csv(common_word, modified_word, model_max_output_tokens, input_path)
+    print(f"Input data ({rows} rows) saved to: {input_path}")
+    return input_path
+
+
+def create_input_df(common_word: str, modified_word: str, model_max_output_tokens: int) -> pd.DataFrame:
+    return pd.DataFrame(list(iter_input_rows(common_word, modified_word, model_max_output_tokens)), columns=INPUT_COLUMNS)
+
+
+def load_word_pairs(word_pairs: list[str] = None, word_pairs_file: str = None) -> list[tuple[str, str]]:
+    # Pairs are "common:modified", given on the command line or one per line in a file (blank lines and # comments skipped)
+    entries = list(word_pairs or [])
+    if word_pairs_file:
+        with open(word_pairs_file) as f:
+            entries.extend(line.strip() for line in f if line.strip() and not line.strip().startswith('#'))
+
+    pairs = []
+    for entry in entries:
+        common_word, separator, modified_word = entry.partition(':')
+        if not separator or not common_word.strip() or not modified_word.strip():
+            raise ValueError(f"Word pair '{entry}' is not of the form common:modified")
+        pairs.append((common_word.strip(), modified_word.strip()))
+    return pairs
 
 
 def get_provider(provider_name: str, model_name: str = None):
@@ -93,32 +256,75 @@ def main():
     parser.add_argument('--provider', type=str, required=True, 
                        choices=['openai', 'anthropic', 'google'],
                        help='Provider to use')
-    parser.add_argument('--output-path', type=str, required=True,
-                       help='Output path for results')
+    parser.add_argument('--output-path', type=str, default=None,
+                       help='Output path for results (single word pair)')
     parser.add_argument('--model-name', type=str, required=True,
                        help='Model to run')
-    parser.add_argument('--common-word', type=str, required=True,
+    parser.add_argument('--common-word', type=str, default=None,
                        help='Common word to repeat')
-    parser.add_argument('--modified-word', type=str, required=True,
+    parser.add_argument('--modified-word', type=str, default=None,
                        help='Modified word to insert')
+    parser.add_argument('--word-pairs', type=str, nargs='+', default=None,
+                       help='Sweep several word pairs given as common:modified through one shared rate limit (use with --output-dir)')
+    parser.add_argument('--word-pairs-file', type=str, default=None,
+                       help='File with one common:modified word pair per line, swept like --word-pairs')
+    parser.add_argument('--output-dir', type=str, default=None,
+                       help='Directory for the sweep results, one repeated_words_<common>_<modified>.csv per pair')
     parser.add_argument('--model-max-output-tokens', type=int, required=True,
                        help='Maximum output tokens for the model')
     parser.add_argument('--max-context-length', type=int, required=True,
                        help='Maximum context length in tokens')
     parser.add_argument('--max-tokens-per-minute', type=int, required=True,
                        help='Maximum tokens per minute for rate limits')
+    parser.add_argument('--trace-path', type=str, default=None,
+                       help='Optional path for a Chrome trace JSON of per-request spans (latency histograms are saved next to it)')
+    parser.add_argument('--stream-guard', action='store_true',
+                       help='Stream outputs and cancel a request once it runs past the gold length or diverges from gold (reason in output_truncation_reason)')
+    parser.add_argument('--guard-length-tolerance', type=float, default=DEFAULT_GUARD_LENGTH_TOLERANCE,
+                       help=f'Fraction of the gold word count an output may run over before it is cancelled (default: {DEFAULT_GUARD_LENGTH_TOLERANCE}, at least {GUARD_MIN_WORDS} words)')
+    parser.add_argument('--guard-max-divergence', type=float, default=DEFAULT_GUARD_MAX_DIVERGENCE,
+                       help=f'Fraction of output words differing from gold at the same position above which an output is cancelled (default: {DEFAULT_GUARD_MAX_DIVERGENCE})')
+    parser.add_argument('--input-cache-dir', type=str, default=DEFAULT_INPUT_CACHE_DIR,
+                       help='Directory of generated input CSVs, reused when the word pair, grid, tokenizer and max output tokens match (default: data/repeated_words_inputs)')
     
     args = parser.parse_args()
     
     try:
-        print(f"Creating input data for {args.common_word} | {args.modified_word}")
-        input_df = create_input_df(args.common_word, args.modified_word, args.model_max_output_tokens)
-
-        input_path = os.path.join(f"../../data/repeated_words_input_{args.common_word}_{args.modified_word}.csv")
-        input_df.to_csv(input_path, index=False)
-        print(f"Input data saved to: {input_path}")
-        
         provider = get_provider(args.provider, args.model_name)
+
+        stream_guard = None
+        if args.stream_guard:
+            stream_guard = lambda row: RepeatedWordsGuard(row['gold'], args.guard_length_tolerance, args.guard_max_divergence)
+
+        if args.word_pairs or args.word_pairs_file:
+            if not args.output_dir:
+                raise ValueError("A sweep over --word-pairs/--word-pairs-file needs --output-dir")
+            os.makedirs(args.output_dir, exist_ok=True)
+            jobs = [
+                (get_input_csv(common_word, modified_word, args.model_max_output_tokens, args.input_cache_dir),
+                 os.path.join(args.output_dir, f"repeated_words_{common_word}_{modified_word}.csv"))
+                for common_word, modified_word in load_word_pairs(args.word_pairs, args.word_pairs_file)
+            ]
+
+            print(f"Running {args.provider} provider with {args.model_name} on {len(jobs)} word pairs")
+            provider.main_many(
+                jobs=jobs,
+                input_column='prompt',
+                output_column='output',
+                model_name=args.model_name,
+                max_context_length=args.max_context_length,
+                max_tokens_per_minute=args.max_tokens_per_minute,
+                trace_path=args.trace_path,
+                stream_guard=stream_guard
+            )
+
+            print(f"Results saved to: {args.output_dir}")
+            return
+
+        if not (args.common_word and args.modified_word and args.output_path):
+            raise ValueError("Pass --common-word, --modified-word and --output-path, or --word-pairs/--word-pairs-file with --output-dir")
+
+        input_path = get_input_csv(args.common_word, args.modified_word, args.model_max_output_tokens, args.input_cache_dir)
         
         print(f"Running {args.provider} provider with {args.model_name}")
         provider.main(
@@ -128,7 +334,9 @@ def main():
             output_column='output',
             model_name=args.model_name,
             max_context_length=args.max_context_length,
-            max_tokens_per_minute=args.max_tokens_per_minute
+            max_tokens_per_minute=args.max_tokens_per_minute,
+            trace_path=args.trace_path,
+            stream_guard=stream_guard
         )
         
         print(f"Results saved to: {args.output_path}")
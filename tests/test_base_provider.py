@@ -0,0 +1,75 @@
+"""
+Unit tests for the batch scheduling in BaseProvider.
+
+Usage:
+    python -m pytest tests/test_base_provider.py
+"""
+
+import sys
+import os
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.base_provider import BaseProvider
+
+
+class SchedulingProvider(BaseProvider):
+    """Provider without a client; only the scheduling methods are used."""
+
+    def process_single_prompt(self, prompt, model_name, max_output_tokens, index):
+        return index, ""
+
+    def get_client(self):
+        return None
+
+
+def batch_tokens(df, batches):
+    return [int(df.loc[batch, 'token_count'].sum()) for batch in batches]
+
+
+def test_batches_stay_within_budget():
+    """Every batch of rows that fit the budget stays within it, and every row is scheduled once."""
+    df = pd.DataFrame({'token_count': [70, 20, 50, 30, 10, 40, 60, 25, 5, 90]})
+    batches = SchedulingProvider().create_batches(df, 100)
+
+    assert sorted(idx for batch in batches for idx in batch) == df.index.tolist()
+    assert all(tokens <= 100 for tokens in batch_tokens(df, batches))
+
+
+def test_best_fit_decreasing_packing():
+    """Long rows open batches first and short rows fill the tightest batch they fit in."""
+    df = pd.DataFrame({'token_count': [60, 50, 40, 30, 20]})
+    batches = SchedulingProvider().create_batches(df, 100)
+
+    # 60 and 50 open two batches; 40 fits best next to 60, 30 and 20 fill the batch with 50
+    assert batches == [[0, 2], [1, 3, 4]]
+    assert batch_tokens(df, batches) == [100, 100]
+
+
+def test_full_batches_are_closed():
+    """A batch filled exactly to the budget takes no further rows."""
+    df = pd.DataFrame({'token_count': [100, 100, 1]})
+    batches = SchedulingProvider().create_batches(df, 100)
+
+    assert batches == [[0], [1], [2]]
+
+
+def test_oversized_rows_get_their_own_batch():
+    """Rows over the budget are still scheduled, alone, without taking in other rows."""
+    df = pd.DataFrame({'token_count': [150, 30, 40]})
+    batches = SchedulingProvider().create_batches(df, 100)
+
+    assert [0] in batches
+    assert sorted(idx for batch in batches if batch != [0] for idx in batch) == [1, 2]
+    assert len(batches) == 2
+
+
+def test_multi_index_rows():
+    """Rows pooled from several files keep their (job, row) index."""
+    df = pd.DataFrame(
+        {'token_count': [80, 20, 80, 20]},
+        index=pd.MultiIndex.from_tuples([(0, 0), (0, 1), (1, 0), (1, 1)], names=['job', 'row'])
+    )
+    batches = SchedulingProvider().create_batches(df, 100)
+
+    assert sorted(map(sorted, batches)) == [[(0, 0), (0, 1)], [(1, 0), (1, 1)]]
@@ -0,0 +1,114 @@
+"""
+Unit tests for the lexical pre-judge and distractor matcher.
+
+Usage:
+    python -m pytest tests/test_lexical_judge.py
+"""
+
+import sys
+import os
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.lexical_judge import prejudge, score_output, match_distractor, calibrate_thresholds
+
+ANSWER = "the quick brown fox"
+DISTRACTORS = ["write every day", "write every week", "read every day"]
+
+
+def test_prejudge_clear_pass_and_fail():
+    """Contained answers pass, empty or missing outputs fail under a fail threshold, partial matches go to the LLM."""
+    assert prejudge("I think it was the quick brown fox.", ANSWER) is True
+    assert prejudge("", ANSWER, fail_threshold=0.05) is False
+    assert prejudge(np.nan, ANSWER, fail_threshold=0.05) is False
+    assert prejudge("a quick brown dog", ANSWER) is None
+
+
+def test_prejudge_never_fails_without_a_fail_threshold():
+    """The default thresholds only pass rows; even an empty output is left to the LLM judge."""
+    assert prejudge("", ANSWER) is None
+    assert prejudge("something else entirely", ANSWER) is None
+
+
+def test_number_words_match_digits():
+    """Number words and digits score as the same token, so spelled-out counts are not missed."""
+    assert prejudge("7", "seven") is True
+    assert prejudge("Twenty-five", "25") is True
+    assert prejudge("1,000 steps", "1000 steps") is True
+    assert score_output("Three plants.", "3")["token_overlap"] == 1.0
+    assert score_output("You currently own four bikes.", "4")["token_overlap"] == 1.0
+
+
+def test_short_answers_are_never_fast_failed():
+    """Non-empty outputs are not failed for missing an answer under MIN_CONTAINMENT_TOKENS words, whatever the threshold."""
+    for output, answer in [("Three plants.", "3"), ("seven", "7"), ("You currently own four bikes.", "4"), ("No idea", "Paris")]:
+        assert prejudge(output, answer, fail_threshold=1.0) is not False
+    assert prejudge("", "Paris", fail_threshold=0.05) is False
+
+
+def test_prejudge_short_answers_are_not_trusted_by_containment():
+    """A one-token answer found in an unrelated output is left to the LLM judge."""
+    assert score_output("there are 3 apples", "3")["containment"] == 0.0
+    assert prejudge("there are 3 apples", "3") is None
+    assert prejudge("there are three apples", "3") is None
+
+
+def test_prejudge_thresholds_are_inclusive():
+    """A score equal to a threshold is decided by that threshold."""
+    score = score_output("a quick brown dog", ANSWER)["score"]
+
+    assert prejudge("a quick brown dog", ANSWER, pass_threshold=score) is True
+    assert prejudge("a quick brown dog", ANSWER, pass_threshold=1.0, fail_threshold=score) is False
+    assert prejudge("a quick brown dog", ANSWER, pass_threshold=np.nextafter(score, 1), fail_threshold=np.nextafter(score, 0)) is None
+
+
+def test_match_distractor_single_phrase():
+    """Exactly one contained phrase, with no near-miss of a sibling, is that phrase's index."""
+    assert match_distractor("My classmate told me to write every week.", DISTRACTORS) == 1
+
+
+def test_match_distractor_unrelated_output():
+    """Outputs far from every phrase are labeled -1 without the LLM."""
+    assert match_distractor("I like pizza.", DISTRACTORS) == -1
+
+
+def test_match_distractor_uncertain_outputs():
+    """Hedged, multiple, near-miss and empty outputs are left to the LLM."""
+    assert match_distractor("Either write every day or write every week.", DISTRACTORS) is None
+    assert match_distractor("write every day and write every week", DISTRACTORS) is None
+    assert match_distractor("You should write every weak.", DISTRACTORS) is None
+    assert match_distractor("write every week, and read a lot", DISTRACTORS) is None
+    assert match_distractor("", DISTRACTORS) is None
+
+
+def judged_rows(rows: list[tuple[str, str]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["output", "llm_judge_output"]).assign(answer=ANSWER)
+
+
+def test_calibrate_thresholds_stop_at_first_disagreement():
+    """The pass threshold stops above the highest-scoring false row, the fail threshold below the lowest true row."""
+    df = judged_rows(
+        [(ANSWER, "true")] * 5
+        + [("quick", "true"), ("fox brown quick the", "false")]
+        + [("", "false")] * 5
+    )
+
+    assert calibrate_thresholds(df) == (1.0, 0.0)
+
+
+def test_calibrate_fail_threshold_ignores_short_answers():
+    """Short-answer rows are never failed locally, so they don't hold the calibrated fail threshold down."""
+    short = pd.DataFrame([("none", "true", "3")] * 5, columns=["output", "llm_judge_output", "answer"])
+    df = pd.concat([judged_rows([("fox brown quick the", "false")] + [("", "false")] * 5), short])
+
+    assert calibrate_thresholds(df)[1] == score_output("fox brown quick the", ANSWER)["score"]
+
+
+def test_calibrate_thresholds_without_disagreement():
+    """When every judged row is true, all of them pass and nothing is failed locally."""
+    df = judged_rows([(ANSWER, "true"), ("a quick brown dog", "true"), ("quick", "true"), ("x", "ERROR: timeout")])
+    pass_threshold, fail_threshold = calibrate_thresholds(df)
+
+    assert pass_threshold == score_output("quick", ANSWER)["score"]
+    assert fail_threshold == -np.inf
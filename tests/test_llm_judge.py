@@ -0,0 +1,83 @@
+"""
+Unit tests for batched judging and verdict recall in the LLM judge.
+
+Usage:
+    python -m pytest tests/test_llm_judge.py
+"""
+
+import sys
+import os
+import json
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.llm_judge import LLMJudge, JudgeEnsemble
+
+PROMPT = "Question: {question} Correct answer: {correct_answer} Response: {output}"
+
+
+class ScriptedProvider:
+    """Answers every request with respond(prompt) and records the prompts it was sent."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.prompts = []
+
+    def get_span_args(self, df, idx, model_name):
+        return {}
+
+    def traced_process_prompt(self, submitted_at, span_args, prompt, model_name, max_output_tokens, index, **kwargs):
+        self.prompts.append(prompt)
+        return index, self.respond(prompt), {}
+
+
+def make_judge(respond, verdict_store_path: str = None) -> LLMJudge:
+    judge = LLMJudge(PROMPT, model_name="judge", provider="ollama", verdict_store_path=verdict_store_path)
+    judge.provider = ScriptedProvider(respond)
+    return judge
+
+
+def make_rows(count: int) -> pd.DataFrame:
+    return pd.DataFrame({"question": ["Q"] * count, "answer": ["A"] * count, "output": ["A"] * count})
+
+
+def test_batch_verdicts_in_one_request():
+    """A well-formed array answers the whole chunk with a single request."""
+    judge = make_judge(lambda prompt: json.dumps([{"id": i, "verdict": True} for i in range(4)]))
+    verdicts, usage = judge._judge_items(make_rows(4), [0, 1, 2, 3])
+
+    assert verdicts == {i: "true" for i in range(4)}
+    assert len(judge.provider.prompts) == 1
+
+
+def test_provider_errors_are_not_split():
+    """An ERROR response is recorded for every item of the chunk instead of splitting it into more failing requests."""
+    judge = make_judge(lambda prompt: "ERROR: connection refused")
+    verdicts, usage = judge._judge_items(make_rows(8), list(range(8)))
+
+    assert verdicts == {i: "ERROR: connection refused" for i in range(8)}
+    assert len(judge.provider.prompts) == 1
+
+
+def test_unparseable_batches_are_split_down_to_single_rows():
+    """A reply that is not a valid array is split in half and retried, down to the single-row prompt."""
+    judge = make_judge(lambda prompt: "true" if prompt.startswith("Question:") else "I cannot judge these")
+    verdicts, usage = judge._judge_items(make_rows(4), [0, 1, 2, 3])
+
+    assert verdicts == {i: "true" for i in range(4)}
+    assert len(judge.provider.prompts) == 7
+
+
+def test_recalled_verdicts_keep_their_confidence(tmp_path):
+    """Constrained verdicts are recalled with their confidence, so the ensemble doesn't escalate them on every rerun."""
+    store_path = str(tmp_path / "verdicts.sqlite")
+    judge = make_judge(lambda prompt: "true", store_path)
+    rows = make_rows(2).assign(output=["A", "B"])
+    judged = rows.assign(judge_0_verdict=["true", "false"], judge_0_verdict_confidence=[0.99, None])
+    judge._remember_verdicts(rows, judged, [0, 1], "judge_0_verdict", constrained=True)
+
+    recalled = rows.copy()
+    assert judge._recall_verdicts(rows, recalled, [0, 1], "judge_0_verdict", constrained=True) == []
+    assert recalled["judge_0_verdict"].tolist() == ["true", "false"]
+    assert recalled.loc[0, "judge_0_verdict_confidence"] == 0.99
+    assert JudgeEnsemble([judge], confidence_threshold=0.9)._is_confident(recalled, 0).tolist() == [True, False]
@@ -0,0 +1,105 @@
+"""
+Unit tests for BM25 session retrieval and prompt assembly for LongMemEval.
+
+Usage:
+    python -m pytest tests/test_longmemeval_retrieval.py
+"""
+
+import sys
+import os
+import math
+import re
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments', 'longmemeval', 'run'))
+
+from sessions import SessionPrompts, PROMPT_HEAD, check_full_prompts
+from create_retrieval_prompts import BM25Index, select_sessions
+
+
+class WordEncoding:
+    """Encodes each word and each run of whitespace as one token, so counts are easy to check by hand."""
+
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\s+|\S+", text)
+
+
+def make_entry() -> dict:
+    def session(text):
+        return [{"role": "user", "content": text}, {"role": "assistant", "content": "noted"}]
+
+    return {
+        "question_id": "q1",
+        "question_type": "single-session-user",
+        "question": "Where did I park the car?",
+        "question_date": "2023/05/30",
+        "answer": "level 3",
+        "haystack_session_ids": ["s0", "s1", "s2"],
+        "haystack_dates": ["2023/05/20", "2023/05/01", "2023/05/10"],
+        "haystack_sessions": [session("I parked the car on level 3"), session("I like tea"), session("My car is red")],
+        "answer_session_ids": ["s0"],
+    }
+
+
+def test_bm25_scores_match_okapi_formula():
+    """Scores follow Okapi BM25 with the smoothed idf, summed over distinct query terms."""
+    documents = ["red car", "blue car car", "red bike"]
+    index = BM25Index(documents, k1=1.5, b=0.75)
+    average_length = 7 / 3
+
+    def term_score(frequency, length, document_frequency):
+        idf = math.log((3 - document_frequency + 0.5) / (document_frequency + 0.5) + 1)
+        return idf * frequency * 2.5 / (frequency + 1.5 * (0.25 + 0.75 * length / average_length))
+
+    expected = [term_score(1, 2, 2) + term_score(1, 2, 2), term_score(2, 3, 2), term_score(1, 2, 2)]
+    assert index.scores("Red CAR red?") == pytest.approx(expected)
+
+
+def test_bm25_rank_is_stable():
+    """Better matches come first, and ties (including no match at all) keep the session order."""
+    index = BM25Index(["tea", "car park", "car", "tea"])
+
+    assert index.rank("car park") == [1, 2, 0, 3]
+    assert index.rank("unknown words") == [0, 1, 2, 3]
+
+
+def test_select_sessions_fills_budget_in_rank_order():
+    """Sessions are taken by rank while they fit; one too long for the rest of the budget is skipped, not the end."""
+    prompts = SessionPrompts(make_entry(), WordEncoding())
+    ranking = [0, 2, 1]
+    budget = prompts.sum_tokens([0, 1])
+
+    assert prompts.block_tokens[2] > prompts.block_tokens[1]
+    assert select_sessions(prompts, ranking, budget) == [0, 1]
+    assert select_sessions(prompts, ranking, prompts.sum_tokens([0, 1, 2])) == [0, 2, 1]
+    assert select_sessions(prompts, ranking, prompts.overhead_tokens) == []
+
+
+def test_prompts_are_chronological_and_counted_exactly():
+    """Selected sessions are laid out by date, and the summed piece counts equal an exact encoding."""
+    prompts = SessionPrompts(make_entry(), WordEncoding())
+    prompt = prompts.prompt([0, 2, 1])
+
+    assert prompt.startswith(PROMPT_HEAD)
+    assert prompt.index("2023/05/01") < prompt.index("2023/05/10") < prompt.index("2023/05/20")
+    assert prompts.linear
+    assert prompts.token_count([0, 1]) == len(WordEncoding().encode(prompts.prompt([0, 1])))
+    assert prompts.evidence_recall([1, 2]) == 0.0 and prompts.evidence_recall([0]) == 1.0
+
+
+def test_check_full_prompts(tmp_path):
+    """All sessions rendered with the shared layout must reproduce the cleaned dataset's full_prompt."""
+    prompts = SessionPrompts(make_entry(), WordEncoding())
+    full_prompt = prompts.prompt([0, 1, 2])
+    cleaned_path = tmp_path / "cleaned_full.csv"
+
+    pd.DataFrame({"question_id": ["q1"], "full_prompt": [full_prompt]}).to_csv(cleaned_path, index=False)
+    check_full_prompts([prompts], str(cleaned_path))
+
+    pd.DataFrame({"question_id": ["q1"], "full_prompt": [full_prompt.replace("Session Date", "Session date", 1)]}).to_csv(cleaned_path, index=False)
+    with pytest.raises(ValueError, match="1 of 1 rendered prompts differ"):
+        check_full_prompts([prompts], str(cleaned_path))
+
+    pd.DataFrame({"question_id": ["q2"], "full_prompt": [full_prompt]}).to_csv(cleaned_path, index=False)
+    with pytest.raises(ValueError, match="No dataset questions"):
+        check_full_prompts([prompts], str(cleaned_path))
@@ -0,0 +1,30 @@
+"""
+Unit tests for the Ollama context size chosen per request.
+
+Usage:
+    python -m pytest tests/test_ollama_num_ctx.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.providers.ollama import OllamaProvider
+
+
+def test_recorded_token_count_is_used():
+    """A prompt with a recorded token_count is sized by it, not by the character estimate."""
+    provider = OllamaProvider()
+    prompt = "word " * 3000
+    provider.token_counts[provider.prompt_key(prompt)] = 3000
+
+    assert len(prompt) // 3 + 100 > 4096
+    assert provider.get_num_ctx(prompt, 100) == 4096
+
+
+def test_unknown_prompts_fall_back_to_character_estimate():
+    """Prompts without a token_count (e.g. judge prompts) assume about 3 characters per token; the context never shrinks."""
+    provider = OllamaProvider()
+
+    assert provider.get_num_ctx("x" * 6000, 100) == 4096
+    assert provider.get_num_ctx("x" * 100, 100) == 4096
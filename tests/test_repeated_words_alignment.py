@@ -0,0 +1,112 @@
+"""
+Unit tests for the word-level alignment of repeated-words outputs.
+
+Usage:
+    python -m pytest tests/test_repeated_words_alignment.py
+"""
+
+import sys
+import os
+import random
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments', 'repeated_words', 'evaluate'))
+
+from evaluate_repeated_words import align_words, evaluate_row, get_word_edits, normalized_levenshtein_score, EDIT_OPS
+
+
+def word_distance(gold: list[str], output: list[str]) -> int:
+    """Textbook dynamic-programming edit distance over words, as the reference for align_words."""
+    previous = list(range(len(output) + 1))
+    for i, gold_word in enumerate(gold, 1):
+        current = [i]
+        for j, output_word in enumerate(output, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (gold_word != output_word)))
+        previous = current
+    return previous[-1]
+
+
+def make_gold(num_words: int, index: int) -> list[str]:
+    words = ["apple"] * num_words
+    words[index] = "apples"
+    return words
+
+
+def perturb(words: list[str], rng: random.Random) -> list[str]:
+    output = list(words)
+    for _ in range(rng.randint(0, 5)):
+        position = rng.randrange(len(output) + 1)
+        op = rng.choice(["insert", "delete", "replace"])
+        if op == "insert":
+            output.insert(position, rng.choice(["apple", "apples", "pear"]))
+        elif position < len(output):
+            if op == "delete":
+                del output[position]
+            else:
+                output[position] = rng.choice(["apple", "apples", "pear"])
+    return output
+
+
+def test_align_words_matches_reference_distance():
+    """Edit counts, score and first edit agree with a plain word-level edit distance."""
+    rng = random.Random(0)
+    for _ in range(500):
+        num_words = rng.randint(1, 40)
+        index = rng.randrange(num_words)
+        gold = make_gold(num_words, index)
+        output = perturb(gold, rng)
+
+        alignment = align_words(output, num_words, index, "apple", "apples")
+        distance = word_distance(gold, output)
+        assert sum(alignment[column] for column in EDIT_OPS.values()) == distance
+        assert len(alignment["word_edits"]) == distance
+
+        if output:
+            assert alignment["word_levenshtein_score"] == 1 - distance / max(len(gold), len(output))
+        else:
+            assert alignment["word_levenshtein_score"] == 0.0
+
+        common_prefix = next((i for i, (a, b) in enumerate(zip(gold, output)) if a != b), min(len(gold), len(output)))
+        assert alignment["first_edit_position"] == (common_prefix if distance else None)
+
+
+def test_align_words_edit_kinds():
+    """Extra output words are insertions, missing gold words deletions, other words substitutions."""
+    gold = make_gold(10, 4)
+
+    assert align_words(gold + ["apple"], 10, 4, "apple", "apples")["word_insertions"] == 1
+    assert align_words(gold[:-2], 10, 4, "apple", "apples")["word_deletions"] == 2
+    replaced = align_words(gold[:4] + ["pear"] + gold[5:], 10, 4, "apple", "apples")
+    assert (replaced["word_substitutions"], replaced["first_edit_position"]) == (1, 4)
+
+
+def test_evaluate_row_keeps_baseline_metrics():
+    """Word alignment only adds columns; the baseline metrics are unchanged by it."""
+    gold = " ".join(make_gold(30, 12))
+    output = " ".join(make_gold(30, 14)[:-1])
+
+    plain = evaluate_row(gold, output, 30, 12, "apple", "apples")
+    aligned = evaluate_row(gold, output, 30, 12, "apple", "apples", word_alignment=True)
+
+    assert "word_edits" not in plain
+    assert {key: aligned[key] for key in plain} == plain
+    assert plain["levenshtein_score"] == normalized_levenshtein_score(gold, output)
+    assert (plain["modified_word_present"], plain["correct_position"], plain["delta"]) == (True, False, 1)
+
+
+def test_word_level_score_replaces_char_level_score():
+    """With the word level, levenshtein_score is the word alignment score."""
+    gold = " ".join(make_gold(30, 12))
+    output = " ".join(make_gold(30, 12)[:-3])
+
+    row = evaluate_row(gold, output, 30, 12, "apple", "apples", levenshtein_level="word")
+    assert row["levenshtein_score"] == row["word_levenshtein_score"] == 1 - 3 / 30
+
+
+def test_get_word_edits_lists_every_edit():
+    """Each edit becomes one row carrying its output's id, num_words and index."""
+    df = pd.DataFrame({"id": ["10_4", "10_0", "20_5"], "num_words": [10, 10, 20], "index": [4, 0, 5]}, index=[7, 3, 9])
+    edits = pd.Series({7: [("insert", 10), ("delete", 2)], 3: [], 9: [("replace", 5)]})
+
+    word_edits = get_word_edits(df, edits)
+    assert word_edits[["id", "op", "gold_position"]].values.tolist() == [["10_4", "insert", 10], ["10_4", "delete", 2], ["20_5", "replace", 5]]
+    assert word_edits["relative_position"].tolist() == [1.0, 0.2, 0.25]
@@ -0,0 +1,74 @@
+"""
+Unit tests for the streaming guard that cancels runaway repeated-words generations.
+
+Usage:
+    python -m pytest tests/test_repeated_words_guard.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments', 'repeated_words', 'run'))
+
+from run_repeated_words import RepeatedWordsGuard, GUARD_MIN_WORDS, create_variations
+
+GOLD = dict(create_variations("apple", "apples", 100))["50"]
+
+
+def stream(guard: RepeatedWordsGuard, text: str, chunk_size: int = 7) -> tuple[str | None, int]:
+    """Feed text in fixed-size chunks, cutting words apart, until the guard cancels; returns (reason, characters sent)."""
+    for end in range(chunk_size, len(text) + chunk_size, chunk_size):
+        reason = guard(text[end - chunk_size:end])
+        if reason is not None:
+            return reason, min(end, len(text))
+    return None, len(text)
+
+
+def test_faithful_copy_runs_to_completion():
+    """An exact copy, streamed in chunks that split words, is never cancelled."""
+    reason, sent = stream(RepeatedWordsGuard(GOLD), GOLD + "\n")
+
+    assert reason is None
+    assert sent == len(GOLD) + 1
+
+
+def test_small_deviations_are_tolerated():
+    """A shifted modified word and a few extra words stay within the defaults."""
+    output = " ".join(["apple"] * 49 + ["apples"] + ["apple"] * 55)
+
+    assert stream(RepeatedWordsGuard(GOLD), output + " ")[0] is None
+
+
+def test_looping_output_is_cancelled():
+    """Output running past gold by the tolerance (at least GUARD_MIN_WORDS words) is cancelled early."""
+    output = " ".join([GOLD] * 5) + " "
+    guard = RepeatedWordsGuard(GOLD)
+    reason, sent = stream(guard, output)
+
+    assert reason == "exceeds_gold_length"
+    assert sent < len(output) / 2
+    assert guard.words == 100 + GUARD_MIN_WORDS + 1
+
+
+def test_length_tolerance_scales_with_gold():
+    """Long gold texts allow a proportional overrun before cancelling."""
+    gold = " ".join(["apple"] * 1000)
+    guard = RepeatedWordsGuard(gold, length_tolerance=0.1)
+
+    assert guard(gold + " " + " ".join(["apple"] * 100) + " ") is None
+    assert guard("apple ") == "exceeds_gold_length"
+
+
+def test_diverging_output_is_cancelled():
+    """Output that stops copying, e.g. a refusal, is cancelled once enough words were compared."""
+    refusal = "I'm sorry, but I can't help with reproducing this text because it is very long and repetitive. " * 3
+    reason, sent = stream(RepeatedWordsGuard(GOLD), refusal)
+
+    assert reason == "diverged"
+    assert len(refusal[:sent].split()) >= GUARD_MIN_WORDS
+
+
+def test_divergence_needs_minimum_words():
+    """A few wrong words at the start are not enough to cancel."""
+    guard = RepeatedWordsGuard(GOLD)
+
+    assert guard("Sure, here it is: ") is None
@@ -0,0 +1,61 @@
+"""
+Unit tests for the persistent judge verdict store.
+
+Usage:
+    python -m pytest tests/test_verdict_store.py
+"""
+
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.verdict_store import VerdictStore, hash_template
+
+
+def test_keys_normalize_whitespace_only(tmp_path):
+    """Whitespace and unicode forms don't change a key; case and punctuation do."""
+    store = VerdictStore(str(tmp_path / "verdicts.sqlite"))
+    template_hash = hash_template("Q {question} A {correct_answer} O {output}")
+    key = store.make_key("judge", template_hash, "What?", "Paris", "It is Paris.")
+
+    assert store.make_key("judge", template_hash, " What? ", "Paris", "It  is\nParis.") == key
+    assert store.make_key("judge", template_hash, "What?", "Paris", "It is paris.") != key
+    assert store.make_key("judge", template_hash, "What?", "Paris", "It is Paris") != key
+
+
+def test_keys_depend_on_judge_and_template(tmp_path):
+    """Another judge model or template (e.g. the constrained one) never reuses a verdict."""
+    store = VerdictStore(str(tmp_path / "verdicts.sqlite"))
+    fields = ("What?", "Paris", "Paris")
+    key = store.make_key("judge", hash_template("free-form"), *fields)
+
+    assert store.make_key("other-judge", hash_template("free-form"), *fields) != key
+    assert store.make_key("judge", hash_template("constrained"), *fields) != key
+
+
+def test_round_trip_across_connections(tmp_path):
+    """Verdicts persist across store instances and are looked up beyond SQLite's parameter limit."""
+    path = str(tmp_path / "nested" / "verdicts.sqlite")
+    template_hash = hash_template("template")
+    store = VerdictStore(path)
+    keys = [store.make_key("judge", template_hash, f"q{i}", "a", "o") for i in range(1200)]
+    store.put_many([(key, "judge", template_hash, "true" if i % 2 else "false", 0.5 if i % 2 else None) for i, key in enumerate(keys)])
+
+    found = VerdictStore(path).get_many(keys + ["missing"])
+    assert len(found) == 1200
+    assert found[keys[0]] == ("false", None) and found[keys[1]] == ("true", 0.5)
+
+
+def test_stores_without_confidence_are_migrated(tmp_path):
+    """A store written before confidences were kept gains the column; its old verdicts have no confidence."""
+    path = str(tmp_path / "verdicts.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE verdicts (key TEXT PRIMARY KEY, judge_model TEXT, template_hash TEXT, verdict TEXT, created_at REAL)")
+    connection.execute("INSERT INTO verdicts VALUES ('old', 'judge', 'hash', 'true', 0)")
+    connection.commit()
+    connection.close()
+
+    store = VerdictStore(path)
+    store.put_many([("new", "judge", "hash", "false", 0.97)])
+    assert store.get_many(["old", "new"]) == {"old": ("true", None), "new": ("false", 0.97)}
@@ -0,0 +1,49 @@
+"""
+Unit tests for parsing constrained judge verdicts and their logprob confidence.
+
+Usage:
+    python -m pytest tests/test_verdicts.py
+"""
+
+import sys
+import os
+import math
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from models.verdicts import parse_verdict, find_verdict_token, verdict_confidence
+
+
+def test_parse_verdict_json_and_bare_answers():
+    """Schema-constrained JSON and free-form true/false answers parse to the same verdicts."""
+    assert parse_verdict('{"verdict": true}') == "true"
+    assert parse_verdict('{"verdict": false}') == "false"
+    assert parse_verdict("true") == "true"
+    assert parse_verdict(" False.") == "false"
+    assert parse_verdict("**TRUE**") == "true"
+
+
+def test_parse_verdict_unparseable():
+    """Anything else is an error, so the row is judged again on the next run."""
+    for response in ['{"verdict": "maybe"}', '{"answer": true}', "I think so", ""]:
+        assert parse_verdict(response).startswith("ERROR_UNPARSEABLE_VERDICT")
+
+
+def test_find_verdict_token():
+    """The verdict is the first true/false token after the JSON punctuation."""
+    assert find_verdict_token(['{"', 'verdict', '":', ' true', '}']) == 3
+    assert find_verdict_token(['{"', 'verdict', '":']) is None
+
+
+def test_verdict_confidence_renormalizes_over_true_and_false():
+    """Other candidate tokens are ignored and case variants of a verdict are summed."""
+    top_logprobs = [(" true", math.log(0.6)), ("True", math.log(0.1)), (" false", math.log(0.1)), (" maybe", math.log(0.2))]
+
+    assert math.isclose(verdict_confidence("true", top_logprobs), 0.7 / 0.8)
+    assert math.isclose(verdict_confidence("false", top_logprobs), 0.1 / 0.8)
+
+
+def test_verdict_confidence_without_alternatives():
+    """No true/false candidates, or an error verdict, give no confidence."""
+    assert verdict_confidence("true", [(" maybe", math.log(0.9))]) is None
+    assert verdict_confidence("ERROR_UNPARSEABLE_VERDICT: x", [(" true", 0.0)]) is None
+    assert verdict_confidence("true", [(" true", 0.0)]) == 1.0